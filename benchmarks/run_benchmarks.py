@@ -0,0 +1,245 @@
+"""
+Time the hot paths of the GBQR and SARIX models on synthetic data, across a
+grid of problem sizes, and compare the timings to a baseline.
+
+Runs fully offline. Examples:
+
+    # record a baseline
+    python benchmarks/run_benchmarks.py --grid quick --output benchmarks/baseline.json
+
+    # after a change, compare against it; exits with status 1 on a regression
+    python benchmarks/run_benchmarks.py --grid quick --output results.json \\
+        --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# progress bars would swamp the timings output
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from synthetic import make_load_data_frame  # noqa: E402
+
+from idmodels.gbqr import GBQRModel, _feature_matrix  # noqa: E402
+from idmodels.postprocess import build_hub_quantile_df, invert_transforms, quantile_noncrossing  # noqa: E402
+from idmodels.preprocess import create_features_and_targets  # noqa: E402
+
+HUB_Q_LEVELS = [0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5,
+                0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.975, 0.99]
+
+# parameter grids for each benchmark; every combination of the listed
+# values is timed
+GRIDS = {
+    "quick": {
+        "create_features_and_targets": {"n_locations": [10, 50], "n_seasons": [5], "n_sources": [1, 3]},
+        "get_test_quantile_predictions": {"n_locations": [10], "n_seasons": [5], "num_bags": [4],
+                                          "n_q_levels": [3]},
+        "quantile_noncrossing": {"n_locations": [50, 500], "n_q_levels": [23]},
+        "hub_formatting": {"n_locations": [50, 500], "n_q_levels": [23]},
+        "sarix_fit": {"n_locations": [5], "n_seasons": [3]}
+    },
+    "full": {
+        "create_features_and_targets": {"n_locations": [10, 50, 200], "n_seasons": [5, 10], "n_sources": [1, 3]},
+        "get_test_quantile_predictions": {"n_locations": [10, 50], "n_seasons": [5, 10], "num_bags": [10],
+                                          "n_q_levels": [3, 23]},
+        "quantile_noncrossing": {"n_locations": [50, 500, 3000], "n_q_levels": [7, 23]},
+        "hub_formatting": {"n_locations": [50, 500, 3000], "n_q_levels": [7, 23]},
+        "sarix_fit": {"n_locations": [5, 50], "n_seasons": [3]}
+    }
+}
+
+SOURCES = ["nhsn", "ilinet", "flusurvnet"]
+
+
+def _q_levels(n_q_levels):
+    if n_q_levels == len(HUB_Q_LEVELS):
+        return HUB_Q_LEVELS
+    return [float(q) for q in np.round(np.linspace(0.05, 0.95, n_q_levels), 3)]
+
+
+def _features(n_locations, n_seasons, n_sources=1):
+    df = make_load_data_frame(n_locations=n_locations, n_seasons=n_seasons, sources=SOURCES[:n_sources])
+    return create_features_and_targets(df=df, incl_level_feats=True, max_horizon=3,
+                                       curr_feat_names=["inc_trans_cs", "season_week", "log_pop"])
+
+
+def _hub_preds(n_locations, n_q_levels, seed=42):
+    rng = np.random.default_rng(seed)
+    q_labels = [str(q) for q in _q_levels(n_q_levels)]
+    n = n_locations * 4
+    return pd.DataFrame({
+        "location": np.tile(np.repeat([f"{i:05d}" for i in range(n_locations)], 4), n_q_levels),
+        "reference_date": datetime.date(2024, 1, 6),
+        "horizon": np.tile(np.arange(4), n_locations * n_q_levels),
+        "target_end_date": np.tile(np.repeat(pd.Timestamp("2024-01-06"), n), n_q_levels),
+        "target": "wk inc flu hosp",
+        "output_type": "quantile",
+        "output_type_id": np.repeat(q_labels, n),
+        "value": rng.normal(size=n * n_q_levels)
+    })
+
+
+def setup_create_features_and_targets(n_locations, n_seasons, n_sources):
+    df = make_load_data_frame(n_locations=n_locations, n_seasons=n_seasons, sources=SOURCES[:n_sources])
+    return lambda: create_features_and_targets(df=df, incl_level_feats=True, max_horizon=3,
+                                               curr_feat_names=["inc_trans_cs", "season_week", "log_pop"])
+
+
+def setup_get_test_quantile_predictions(n_locations, n_seasons, num_bags, n_q_levels):
+    df, feat_names = _features(n_locations, n_seasons)
+    df_test = df.loc[df["wk_end_date"] == df["wk_end_date"].max()]
+    df_train = df.loc[~df["delta_target"].isna().values]
+    x_train = _feature_matrix(df_train, feat_names)
+    y_train = df_train["delta_target"].to_numpy()
+    x_test = _feature_matrix(df_test, feat_names)
+
+    q_levels = _q_levels(n_q_levels)
+    model = GBQRModel(SimpleNamespace(model_name="benchmark", num_bags=num_bags, bag_frac_samples=0.7,
+                                      fit_locations_separately=False))
+    run_config = SimpleNamespace(ref_date=datetime.date(2024, 1, 6), q_levels=q_levels,
+                                 q_labels=[str(q) for q in q_levels], save_feat_importance=False)
+    return lambda: model._get_test_quantile_predictions(run_config, df_train, x_train, y_train, x_test, feat_names)
+
+
+def setup_quantile_noncrossing(n_locations, n_q_levels):
+    preds_df = _hub_preds(n_locations, n_q_levels)
+    gcols = ["location", "reference_date", "horizon", "target_end_date", "target", "output_type"]
+    return lambda: quantile_noncrossing(preds_df, gcols)
+
+
+def setup_hub_formatting(n_locations, n_q_levels):
+    preds_df = _hub_preds(n_locations, n_q_levels)
+    n = preds_df.shape[0]
+
+    def run():
+        value = invert_transforms(inc_trans_cs_hat=preds_df["value"].to_numpy(), center=np.full(n, 0.5),
+                                  scale=np.full(n, 1.5), pop=np.full(n, 1e6), inv_power=4, scale_offset=0.01)
+        return build_hub_quantile_df(location=preds_df["location"].to_numpy(),
+                                     wk_end_date=preds_df["target_end_date"].to_numpy(),
+                                     horizon=preds_df["horizon"].to_numpy(),
+                                     output_type_id=preds_df["output_type_id"].to_numpy(),
+                                     value=value, ref_date=datetime.date(2024, 1, 6), disease="flu")
+    return run
+
+
+def setup_sarix_fit(n_locations, n_seasons):
+    from idmodels.sarix import SARIXModel
+
+    model = SARIXModel(SimpleNamespace(model_name="benchmark", sources=["nhsn"], power_transform="4rt",
+                                       p=2, d=0, P=0, D=0, season_period=1, theta_pooling="shared",
+                                       sigma_pooling="none", x=[]))
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2024, 1, 6), max_horizon=3,
+                                 q_levels=HUB_Q_LEVELS, q_labels=[str(q) for q in HUB_Q_LEVELS],
+                                 num_warmup=100, num_samples=100, num_chains=1)
+    df = model.prepare_data(run_config, make_load_data_frame(n_locations=n_locations, n_seasons=n_seasons))
+    return lambda: model.predict(run_config, df)
+
+
+BENCHMARKS = {
+    "create_features_and_targets": setup_create_features_and_targets,
+    "get_test_quantile_predictions": setup_get_test_quantile_predictions,
+    "quantile_noncrossing": setup_quantile_noncrossing,
+    "hub_formatting": setup_hub_formatting,
+    "sarix_fit": setup_sarix_fit
+}
+
+
+def time_benchmark(fn, repeat):
+    """
+    Call `fn` once to warm up, then `repeat` times, returning the run times in seconds.
+    """
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(grid, repeat, only=None):
+    results = []
+    for name, param_grid in GRIDS[grid].items():
+        if only and name not in only:
+            continue
+        for values in itertools.product(*param_grid.values()):
+            params = dict(zip(param_grid.keys(), values))
+            fn = BENCHMARKS[name](**params)
+            times = time_benchmark(fn, repeat)
+            results.append({"benchmark": name, "params": params,
+                            "min_s": min(times), "median_s": statistics.median(times), "repeat": repeat})
+            print(f"{name:32s} {json.dumps(params):80s} min {min(times):9.4f}s", flush=True)
+    return results
+
+
+def compare(results, baseline_results, tolerance):
+    """
+    Compare minimum run times to those of a baseline.
+
+    Returns
+    -------
+    list of (benchmark, params, ratio) tuples for benchmarks that are more
+    than `tolerance` slower than the baseline
+    """
+    baseline = {(r["benchmark"], json.dumps(r["params"], sort_keys=True)): r for r in baseline_results}
+    regressions = []
+    print("\ncomparison with baseline (ratio of minimum run times):")
+    for r in results:
+        key = (r["benchmark"], json.dumps(r["params"], sort_keys=True))
+        if key not in baseline:
+            print(f"{key[0]:32s} {key[1]:80s} not in baseline")
+            continue
+        ratio = r["min_s"] / baseline[key]["min_s"]
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{key[0]:32s} {key[1]:80s} {ratio:6.2f}x {flag}")
+        if flag:
+            regressions.append((r["benchmark"], r["params"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", choices=GRIDS.keys(), default="quick")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS.keys(), help="benchmarks to run; default all")
+    parser.add_argument("--output", type=Path, help="JSON file to save results to")
+    parser.add_argument("--baseline", type=Path, help="JSON file with baseline results to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown beyond which a benchmark is reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.grid, args.repeat, args.only)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps({
+            "metadata": {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "grid": args.grid
+            },
+            "results": results
+        }, indent=2))
+
+    if args.baseline is not None:
+        regressions = compare(results, json.loads(args.baseline.read_text())["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
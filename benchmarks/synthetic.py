@@ -0,0 +1,81 @@
+"""
+Synthetic data shaped like the output of iddata's `DiseaseDataLoader.load_data`,
+for benchmarking without network access.
+"""
+import numpy as np
+import pandas as pd
+
+
+def make_load_data_frame(n_locations=10, n_seasons=5, sources=("nhsn",), last_date="2023-12-30",
+                         power_transform="4rt", seed=42):
+    """
+    Generate a data frame with the columns and row order of the data frames
+    returned by `DiseaseDataLoader.load_data`: one row per combination of
+    source, location and week, with rows in date order within each source
+    and location, and power transformed, scaled and centered incidence.
+
+    Parameters
+    ----------
+    n_locations: number of locations. The first is "US", with agg_level
+      "national"; the others are states.
+    n_seasons: number of seasons, the last of which ends at `last_date`
+    sources: data sources to generate data for
+    last_date: date of the last week of data, a Saturday
+    power_transform: "4rt" or None
+    seed: seed for random number generation
+
+    Returns
+    -------
+    Pandas data frame
+    """
+    rng = np.random.default_rng(seed)
+    last_date = pd.Timestamp(last_date)
+
+    # weeks of all seasons; seasons start in the week ending on the first
+    # Saturday of August
+    first_season = last_date.year - n_seasons + (1 if last_date.month >= 8 else 0)
+    season_starts = [pd.Timestamp(f"{first_season + s}-08-01") for s in range(n_seasons)]
+    season_starts = [d + pd.Timedelta(days=(5 - d.weekday()) % 7) for d in season_starts]
+    wk_end_date = pd.date_range(season_starts[0], last_date, freq="7D")
+    season_ind = np.searchsorted(np.array(season_starts, dtype="datetime64[ns]"), wk_end_date.values, side="right") - 1
+    season_week = (wk_end_date.values - np.array(season_starts, dtype="datetime64[ns]")[season_ind]) \
+        // np.timedelta64(7, "D") + 1
+    season = [f"{first_season + s}/{str(first_season + s + 1)[2:]}" for s in season_ind]
+    n_weeks = len(wk_end_date)
+
+    locations = ["US"] + [f"{i:02d}" for i in range(1, n_locations)]
+    pop = np.concatenate([[3.3e8], rng.uniform(5e5, 4e7, size=n_locations - 1)])
+
+    frames = []
+    for source in sources:
+        # seasonal epidemic curves with location-specific peak timing and size
+        peak_week = rng.normal(20, 3, size=(n_locations, n_seasons))[:, season_ind]
+        peak_rate = rng.lognormal(1.5, 0.5, size=(n_locations, n_seasons))[:, season_ind]
+        rate = peak_rate * np.exp(-0.5 * ((season_week[None, :] - peak_week) / 4) ** 2) \
+            * rng.lognormal(0, 0.1, size=(n_locations, n_weeks))
+        inc = rate * pop[:, None] / 100000
+
+        if power_transform == "4rt":
+            inc_trans = (rate + 0.01 + 0.75**4) ** 0.25
+        else:
+            inc_trans = rate + 0.01 + 0.75**4
+        scale_factor = np.quantile(inc_trans, 0.95, axis=1, keepdims=True)
+        center_factor = np.mean(inc_trans / scale_factor, axis=1, keepdims=True)
+
+        frames.append(pd.DataFrame({
+            "agg_level": np.repeat(["national"] + ["state"] * (n_locations - 1), n_weeks),
+            "location": np.repeat(locations, n_weeks),
+            "season": np.tile(season, n_locations),
+            "season_week": np.tile(season_week, n_locations),
+            "wk_end_date": np.tile(wk_end_date.values, n_locations),
+            "inc": inc.ravel(),
+            "source": source,
+            "pop": np.repeat(pop, n_weeks),
+            "log_pop": np.repeat(np.log(pop), n_weeks),
+            "inc_trans": inc_trans.ravel(),
+            "inc_trans_scale_factor": np.repeat(scale_factor[:, 0], n_weeks),
+            "inc_trans_cs": (inc_trans / scale_factor - center_factor).ravel(),
+            "inc_trans_center_factor": np.repeat(center_factor[:, 0], n_weeks)
+        }))
+
+    return pd.concat(frames, axis=0, ignore_index=True)
@@ -1 +1,24 @@
+import importlib
+
 __version__ = "0.0.1"
+
+# model classes are imported on first access, so that importing the package
+# only imports the dependencies of the models that are used
+_LAZY_ATTRS = {
+    "GBQRModel": "idmodels.gbqr",
+    "SARIXModel": "idmodels.sarix",
+    "run_backtest": "idmodels.backtest"
+}
+
+__all__ = ["__version__", *_LAZY_ATTRS]
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        return getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
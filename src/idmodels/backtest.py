@@ -0,0 +1,102 @@
+import bisect
+import copy
+import datetime
+import functools
+import itertools
+
+import pandas as pd
+
+from idmodels.utils import imap_ordered, save_predictions, validate_ref_date, worker_pool
+
+
+def run_backtest(model, run_config, ref_dates, as_of_dates=None, obs_lag_weeks=1,
+                 num_workers=1, backend="thread"):
+    """
+    Generate predictions from a model for several reference dates, loading
+    and featurizing data once per data vintage rather than once per
+    reference date.
+
+    For each reference date, observations after the last date available at
+    that reference date are masked, as are training targets falling after
+    it. With the latest vintage, values of earlier observations reflect
+    later revisions, and data transforms are based on all data; use
+    `as_of_dates` to backtest against snapshots of the data as they were.
+
+    Predictions for each reference date are saved in the model output
+    directory, one file per reference date, as `run` does.
+
+    Parameters
+    ----------
+    model: model object with `load_data`, `prepare_data` and `predict`
+      methods, e.g. a GBQRModel or SARIXModel
+    run_config: configuration object with settings for the run; `ref_date`
+      is replaced by each of `ref_dates` in turn
+    ref_dates: list of reference dates, all Saturdays
+    as_of_dates: optional list of data vintage dates. Each reference date
+      uses the latest vintage on or before it; passing `ref_dates` here
+      reproduces the data available in real time. Default, None, uses the
+      latest vintage for all reference dates.
+    obs_lag_weeks: number of weeks between the date of the last observation
+      available at a reference date and the reference date
+    num_workers: number of workers used to generate predictions for
+      reference dates in parallel. Default, 1, works serially. Models that
+      warm start from earlier reference dates always work serially.
+    backend: "thread" (default) or "process", the kind of worker pool
+
+    Returns
+    -------
+    Pandas data frame with predictions for all reference dates
+    """
+    ref_dates = sorted(validate_ref_date(ref_date) for ref_date in ref_dates)
+    if not ref_dates:
+        raise ValueError("ref_dates must not be empty")
+
+    if as_of_dates is None:
+        vintages = [None] * len(ref_dates)
+    else:
+        as_of_dates = sorted(as_of_dates)
+        vintages = []
+        for ref_date in ref_dates:
+            i = bisect.bisect_right(as_of_dates, ref_date)
+            if i == 0:
+                raise ValueError(f"no as_of date on or before ref_date {ref_date}")
+            vintages.append(as_of_dates[i - 1])
+
+    # warm starts continue from state saved by runs for earlier reference
+    # dates, so reference dates must then be run one at a time, in order
+    if getattr(model.model_config, "booster_store", None) == "warm_start" or \
+            getattr(model.model_config, "mcmc_warm_start", False):
+        num_workers = 1
+
+    def tasks():
+        # reference dates are sorted, so those sharing a vintage are
+        # adjacent; data for the next vintage are only loaded once the
+        # workers are busy with the reference dates of the current one
+        for as_of, group in itertools.groupby(zip(vintages, ref_dates), key=lambda task: task[0]):
+            data = model.prepare_data(run_config, model.load_data(run_config, as_of=as_of))
+            for _, ref_date in group:
+                yield ref_date, data
+
+    with worker_pool(num_workers, backend) as executor:
+        preds = imap_ordered(
+            functools.partial(_predict_ref_date, model, run_config, obs_lag_weeks),
+            tasks(), executor, max_pending=2 * (num_workers or 1))
+        preds_df = pd.concat(list(preds), axis=0, ignore_index=True)
+
+    return preds_df
+
+
+def _predict_ref_date(model, run_config, obs_lag_weeks, task):
+    """
+    Generate and save predictions for a single reference date. Defined at
+    module level so that it can be sent to a process pool.
+    """
+    ref_date, data = task
+    ref_date_run_config = copy.copy(run_config)
+    ref_date_run_config.ref_date = ref_date
+
+    preds_df = model.predict(ref_date_run_config, data,
+                             last_obs_date=ref_date - datetime.timedelta(weeks=obs_lag_weeks))
+    save_predictions(preds_df, ref_date_run_config, model.model_config)
+
+    return preds_df
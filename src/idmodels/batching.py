@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+
+class SeriesBatch():
+    """
+    Dense batch of weekly time series, one per location, on a shared grid
+    of dates.
+
+    Values are placed into an array with shape (number of locations, number
+    of dates, number of features) through an explicit index of locations
+    and dates, so that series may be of different lengths, have gaps, or
+    come in any row order. Missing values are filled by linear
+    interpolation within each location's series, extending the first and
+    last observed values to the ends of the grid, and `mask` records which
+    values were observed.
+
+    Parameters
+    ----------
+    df: data frame with columns "location", "wk_end_date" and `value_cols`,
+      with at most one row per combination of location and date
+    value_cols: list of names of columns with the features, in the order of
+      the last axis of the batch
+    dates: optional dates of the grid. Default, None, uses all dates in `df`.
+
+    Attributes
+    ----------
+    locations: list of locations, in order of their first appearance in
+      the data frames they were added from
+    dates: pandas DatetimeIndex of the dates of the grid, in increasing order
+    values: numpy array of gap-filled values with shape (number of
+      locations, number of dates, number of features)
+    mask: boolean numpy array with shape (number of locations, number of
+      dates), True where all features were observed
+    """
+    def __init__(self, df, value_cols, dates=None):
+        self.value_cols = list(value_cols)
+        if dates is None:
+            dates = df["wk_end_date"].unique()
+        self.dates = pd.DatetimeIndex(dates).sort_values()
+        self.locations = []
+        self.values = np.empty((0, len(self.dates), len(self.value_cols)))
+        self.mask = np.empty((0, len(self.dates)), dtype=bool)
+        self.add_locations(df)
+
+
+    def add_locations(self, df):
+        """
+        Add the series of new locations to the batch, without changing
+        those of the locations already in it.
+
+        Parameters
+        ----------
+        df: data frame like the one the batch was created from, with rows
+          for locations that are not yet in the batch and dates on its grid
+        """
+        new_locations = pd.unique(df["location"])
+        if len(set(new_locations) & set(self.locations)) > 0:
+            raise ValueError("df has locations that are already in the batch")
+        if df.duplicated(["location", "wk_end_date"]).any():
+            raise ValueError("df has more than one row for some combination of location and wk_end_date")
+
+        loc_inds = pd.Index(new_locations).get_indexer(df["location"])
+        date_inds = self.dates.get_indexer(pd.DatetimeIndex(df["wk_end_date"]))
+        if (date_inds < 0).any():
+            raise ValueError("df has dates that are not on the grid of the batch")
+
+        n_dates, n_feats = len(self.dates), len(self.value_cols)
+        values = np.full((len(new_locations), n_dates, n_feats), np.nan)
+        values[loc_inds, date_inds, :] = df[self.value_cols].to_numpy(dtype=np.float64)
+        mask = ~np.isnan(values).any(axis=2)
+
+        # interpolate within each series: one column per location and feature
+        values = pd.DataFrame(values.transpose(1, 0, 2).reshape(n_dates, -1)) \
+            .interpolate(limit_direction="both") \
+            .to_numpy() \
+            .reshape(n_dates, len(new_locations), n_feats) \
+            .transpose(1, 0, 2)
+
+        self.locations.extend(new_locations)
+        self.values = np.concatenate([self.values, values], axis=0)
+        self.mask = np.concatenate([self.mask, mask], axis=0)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+from pathlib import Path
+
+from idmodels.utils import atomic_write
+
+
+class BoosterStore():
+    """
+    Persistent store of trained LightGBM boosters.
+
+    Each booster is saved in LightGBM's text format together with a
+    fingerprint of the inputs it was trained on, so that a later run can
+    tell whether a stored booster can be reused as is.
+
+    Parameters
+    ----------
+    root: directory in which to keep the store
+    key: JSON-serializable description of the model, e.g. its configuration.
+      Boosters for different keys are stored separately.
+    """
+    def __init__(self, root, key):
+        description = json.dumps(key, sort_keys=True, default=str)
+        self.store_dir = Path(root) / hashlib.sha256(description.encode()).hexdigest()
+
+
+    def load(self, name):
+        """
+        Load a stored booster.
+
+        Parameters
+        ----------
+        name: name of the booster, e.g. identifying its bag and quantile level
+
+        Returns
+        -------
+        tuple with the lgb.Booster and the fingerprint it was saved with, or
+        (None, None) if there is no stored booster with that name
+        """
+        import lightgbm as lgb
+        
+        try:
+            fingerprint = json.loads(self._manifest_path(name).read_text())["fingerprint"]
+            booster = lgb.Booster(model_file=self._model_path(name))
+        except FileNotFoundError:
+            return None, None
+
+        return booster, fingerprint
+
+
+    def save(self, name, booster, fingerprint):
+        """
+        Save a booster, replacing any stored booster with the same name.
+
+        Parameters
+        ----------
+        name: name of the booster
+        booster: lgb.Booster
+        fingerprint: string identifying the inputs the booster was trained on
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write(self._model_path(name), lambda path: booster.save_model(path))
+        atomic_write(self._manifest_path(name),
+                     lambda path: path.write_text(json.dumps({"fingerprint": fingerprint})))
+
+
+    def _model_path(self, name):
+        return self.store_dir / f"{name}.txt"
+
+
+    def _manifest_path(self, name):
+        return self.store_dir / f"{name}.json"
+
+
+def fingerprint(*parts):
+    """
+    Hash of a sequence of numpy arrays and JSON-serializable values.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if hasattr(part, "tobytes"):
+            h.update(str((part.dtype, part.shape)).encode())
+            h.update(part.tobytes())
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+
+    return h.hexdigest()
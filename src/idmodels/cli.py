@@ -0,0 +1,181 @@
+"""
+Command-line batch runner: generate predictions from many model variants in
+one process, loading and featurizing data once for all variants that share
+the same data requirements.
+"""
+import argparse
+import datetime
+import importlib
+import itertools
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from idmodels.utils import imap_ordered, save_predictions, validate_ref_date, worker_pool
+
+_MODEL_CLASSES = {
+    "gbqr": ("idmodels.gbqr", "GBQRModel"),
+    "sarix": ("idmodels.sarix", "SARIXModel")
+}
+
+
+def load_configs(path, ref_date=None):
+    """
+    Read run and model configs from a JSON file with keys "run_configs", a
+    list of run settings, or "run_config", a single set of run settings,
+    and "model_configs", a list of model settings. Each model config has a
+    "model_class", "gbqr" or "sarix".
+
+    Run settings ending in "_root" are converted to paths, and "ref_date" to
+    a date. A missing "ref_date" means the next Saturday.
+
+    Parameters
+    ----------
+    path: path of the JSON file
+    ref_date: optional reference date overriding those in the file
+
+    Returns
+    -------
+    tuple with a list of run configs and a list of model configs
+    """
+    config = json.loads(Path(path).read_text())
+    if "run_configs" in config:
+        run_settings = config["run_configs"]
+    else:
+        run_settings = [config["run_config"]]
+
+    run_configs = []
+    for settings in run_settings:
+        run_config = SimpleNamespace(**settings)
+        for key, value in settings.items():
+            if key.endswith("_root") and value is not None:
+                setattr(run_config, key, Path(value))
+        if ref_date is not None:
+            run_config.ref_date = ref_date
+        elif isinstance(getattr(run_config, "ref_date", None), str):
+            run_config.ref_date = datetime.date.fromisoformat(run_config.ref_date)
+        run_config.ref_date = validate_ref_date(getattr(run_config, "ref_date", None))
+        run_configs.append(run_config)
+
+    model_configs = [SimpleNamespace(**settings) for settings in config["model_configs"]]
+    for model_config in model_configs:
+        if getattr(model_config, "model_class", None) not in _MODEL_CLASSES:
+            raise ValueError(f"model_class must be one of {list(_MODEL_CLASSES)}")
+
+    return run_configs, model_configs
+
+
+def data_key(model_config, run_config):
+    """
+    Description of the data that a model variant loads. Variants with the
+    same key share one call to `load_data`.
+    """
+    return {
+        "model_class": model_config.model_class,
+        "disease": run_config.disease,
+        "sources": model_config.sources,
+        "power_transform": model_config.power_transform,
+        "reporting_adj": getattr(model_config, "reporting_adj", None)
+    }
+
+
+def feature_key(model_config, run_config):
+    """
+    Description of the prepared data that a model variant uses. Variants
+    with the same key share one call to `prepare_data`.
+    """
+    key = data_key(model_config, run_config)
+    if model_config.model_class == "gbqr":
+        key.update({
+            "incl_level_feats": model_config.incl_level_feats,
+            "categorical_feats": getattr(model_config, "categorical_feats", False)
+        })
+
+    return key
+
+
+def run_variants(run_configs, model_configs, num_workers=1, backend="thread"):
+    """
+    Generate and save predictions from each model variant for each run
+    config, loading data once per run config and data key, and preparing it
+    once per feature key.
+
+    Parameters
+    ----------
+    run_configs: list of configuration objects with settings for the runs
+    model_configs: list of configuration objects with settings for the models
+    num_workers: number of variants to run in parallel. Default, 1, runs
+      them serially.
+    backend: "thread" (default) or "process", the kind of worker pool
+
+    Returns
+    -------
+    list of tuples with the run config, the model config, and the data
+    frame with predictions, for each run config and model variant. Within
+    each run config, variants are ordered by their data requirements.
+    """
+    def tasks():
+        # variants are ordered by their data requirements, so that variants
+        # sharing data are adjacent and data for the next group is loaded
+        # while the workers are busy with the previous one
+        for run_config in run_configs:
+            def keys(model_config):
+                return (_key_str(data_key(model_config, run_config)), _key_str(feature_key(model_config, run_config)))
+
+            ordered = sorted(model_configs, key=keys)
+            for _, data_group in itertools.groupby(ordered, key=lambda mc: keys(mc)[0]):
+                data_group = list(data_group)
+                df = _model(data_group[0]).load_data(run_config, as_of=run_config.ref_date)
+                for _, feature_group in itertools.groupby(data_group, key=keys):
+                    feature_group = list(feature_group)
+                    data = _model(feature_group[0]).prepare_data(run_config, df)
+                    for model_config in feature_group:
+                        yield run_config, model_config, data
+
+    with worker_pool(num_workers, backend) as executor:
+        return list(imap_ordered(_run_variant, tasks(), executor, max_pending=2 * (num_workers or 1)))
+
+
+def _key_str(key):
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def _model(model_config):
+    module_name, class_name = _MODEL_CLASSES[model_config.model_class]
+    return getattr(importlib.import_module(module_name), class_name)(model_config)
+
+
+def _run_variant(task):
+    """
+    Generate and save predictions from one model variant. Defined at module
+    level so that it can be sent to a process pool.
+    """
+    run_config, model_config, data = task
+    preds_df = _model(model_config).predict(run_config, data)
+    save_predictions(preds_df, run_config, model_config)
+
+    return run_config, model_config, preds_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="idmodels", description=__doc__)
+    parser.add_argument("config", type=Path,
+                        help='JSON file with "run_config" or "run_configs", and "model_configs"')
+    parser.add_argument("--ref-date", type=datetime.date.fromisoformat,
+                        help="reference date, overriding those in the config file")
+    parser.add_argument("--num-workers", type=int, default=1, help="number of variants to run in parallel")
+    parser.add_argument("--backend", choices=["thread", "process"], default="thread",
+                        help="kind of worker pool used to run variants in parallel")
+    args = parser.parse_args(argv)
+
+    run_configs, model_configs = load_configs(args.config, ref_date=args.ref_date)
+    results = run_variants(run_configs, model_configs, num_workers=args.num_workers, backend=args.backend)
+    for run_config, model_config, preds_df in results:
+        print(f"{run_config.ref_date} {model_config.model_name}: {preds_df.shape[0]} predictions")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from idmodels.utils import atomic_write
+
+
+class DataCache():
+    """
+    Local, content-addressed cache of `DiseaseDataLoader.load_data` results.
+
+    Each result is stored as a Parquet file named by a hash of the arguments
+    to `load_data`. When the total size of the cache exceeds `max_bytes`,
+    the least recently used results are evicted. Writing and reading Parquet
+    files requires the optional dependency pyarrow.
+
+    Requests without an `as_of` date in `nhsn_kwargs` are not cached, since
+    the latest data change over time.
+    """
+    def __init__(self, root, max_bytes=None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+
+    def load_data(self, loader, **kwargs):
+        """
+        Load data through the cache.
+
+        Parameters
+        ----------
+        loader: object with a `load_data` method, e.g. an iddata DiseaseDataLoader
+        **kwargs: arguments to `loader.load_data`
+
+        Returns
+        -------
+        Pandas data frame returned by `loader.load_data(**kwargs)`
+        """
+        if (kwargs.get("nhsn_kwargs") or {}).get("as_of") is None:
+            return loader.load_data(**kwargs)
+
+        path = self._path(kwargs)
+        try:
+            df = pd.read_parquet(path)
+            # record the access for least recently used eviction
+            os.utime(path)
+            return df
+        except FileNotFoundError:
+            pass
+
+        df = loader.load_data(**kwargs)
+
+        # concurrent readers never see a partially written result
+        self.root.mkdir(parents=True, exist_ok=True)
+        atomic_write(path, df.to_parquet)
+        self._evict(keep=path)
+
+        return df
+
+
+    def invalidate(self, **kwargs):
+        """
+        Remove the cached result for the given `load_data` arguments, if any.
+
+        Returns
+        -------
+        boolean indicating whether a cached result was removed
+        """
+        try:
+            self._path(kwargs).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+
+    def clear(self):
+        """
+        Remove all cached results.
+        """
+        for path in self.root.glob("*.parquet"):
+            path.unlink(missing_ok=True)
+
+
+    def _path(self, kwargs):
+        key = json.dumps(kwargs, sort_keys=True, default=str)
+        return self.root / f"{hashlib.sha256(key.encode()).hexdigest()}.parquet"
+
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        for path in self.root.glob("*.parquet"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+
+
+def cached_load_data(loader, run_config, **kwargs):
+    """
+    Call `loader.load_data(**kwargs)`, through a `DataCache` if the run
+    config specifies a `data_cache_root`. The size of the cache can be
+    bounded by `data_cache_max_bytes`.
+
+    Parameters
+    ----------
+    loader: object with a `load_data` method, e.g. an iddata DiseaseDataLoader
+    run_config: configuration object with settings for the run
+    **kwargs: arguments to `loader.load_data`
+
+    Returns
+    -------
+    Pandas data frame returned by `loader.load_data(**kwargs)`
+    """
+    cache_root = getattr(run_config, "data_cache_root", None)
+    if cache_root is None:
+        return loader.load_data(**kwargs)
+
+    cache = DataCache(cache_root, max_bytes=getattr(run_config, "data_cache_max_bytes", None))
+    return cache.load_data(loader, **kwargs)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from idmodels.utils import atomic_write
+
+_GROUP_COLS = ["source", "location"]
+_KEY_COLS = _GROUP_COLS + ["wk_end_date"]
+# columns of the store other than features: row fingerprints and the
+# standardization factors that stored features were computed with
+_META_COLS = ["_hash", "_scale", "_center"]
+
+
+class FeatureStore():
+    """
+    Persistent store of featurized data, used to featurize incrementally.
+
+    For each combination of source and location, the store keeps the
+    computed features and targets together with a fingerprint of each input
+    row they were computed from. On the next call, features and targets are
+    only recomputed for rows whose trailing window or forecast targets touch
+    new or revised input rows; all other rows are read from the store.
+
+    Standardized data, such as "inc_trans_cs", are usually rescaled with
+    factors computed from the whole series, so that each new data vintage
+    changes every standardized value. For features that are linear in the
+    standardized data, the store can fingerprint the unstandardized data
+    instead and carry stored features over to the new factors; see the
+    `standardization` argument of `featurize`. Reused features then match
+    those of a full recomputation up to floating point error.
+
+    Writing and reading the store requires the optional dependency pyarrow.
+
+    Parameters
+    ----------
+    root: directory in which to keep the store
+    namespace: optional JSON-serializable description of the data, e.g. the
+      disease, sources and power transform. Data with different namespaces
+      are stored separately.
+    """
+    def __init__(self, root, namespace=None):
+        self.root = Path(root)
+        self.namespace = namespace
+
+
+    def featurize(self, df, featurize_fn, key, value_cols, lookback, lookahead, standardization=None):
+        """
+        Featurize a data frame, reusing stored results where possible.
+
+        Parameters
+        ----------
+        df: data frame with one row per combination of "source", "location"
+          and "wk_end_date", with rows in date order within each source and
+          location
+        featurize_fn: function taking a data frame like `df` and returning a
+          tuple with the augmented data frame, with one row per combination
+          of input row and "horizon", and a list of new feature names. Input
+          columns must be passed through.
+        key: JSON-serializable description of `featurize_fn`
+        value_cols: list of columns of `df` that `featurize_fn` reads, in
+          addition to "source", "location" and "wk_end_date"
+        lookback: number of preceding rows within a source and location that
+          the features of a row depend on
+        lookahead: number of following rows within a source and location that
+          the targets of a row depend on
+        standardization: optional dictionary describing how the data that
+          `featurize_fn` reads were standardized from `value_cols`, as
+          `value / (scale + scale_offset) - center` with factors that are
+          constant within a source and location, with keys:
+          - "scale" and "center": names of the columns of `df` with the factors
+          - "scale_offset": optional number added to the scale factors
+          - "kind": function of the name of a new column returning how it
+            depends on the standardized data: "affine" if it changes by
+            `a * x + b` when they do, e.g. levels and targets; "scale" if it
+            changes by `a * x`, e.g. slopes; or None if it does not depend
+            on them
+          Stored rows with unchanged `value_cols` are then reused even if the
+          factors changed, with features transformed to the new factors.
+
+        Returns
+        -------
+        tuple with:
+        - `df`, augmented with the new columns from `featurize_fn`, with rows
+          ordered by horizon, then by the order of the rows of `df`
+        - a list of new feature names
+        """
+        store_dir = self._store_dir(key)
+        features_path = store_dir / "features.parquet"
+        feat_names_path = store_dir / "feat_names.json"
+
+        df = df.reset_index(drop=True)
+        row_hash = pd.util.hash_pandas_object(df[_KEY_COLS + value_cols], index=False).to_numpy()
+        pos = df.groupby(_GROUP_COLS, sort=False)["wk_end_date"].cumcount().to_numpy()
+
+        stored = pd.read_parquet(features_path) if features_path.exists() else None
+        if stored is not None and (standardization is not None) != ("_scale" in stored.columns):
+            stored = None
+
+        # rows at or after `keep_from` within their group get newly computed
+        # features; earlier rows back to `keep_from - lookback` are context
+        keep_from = self._first_changed_pos(df, row_hash, stored) - lookahead
+        recompute = pos >= keep_from
+        in_context = pos >= keep_from - lookback
+
+        parts = []
+        if in_context.any():
+            computed, feat_names = featurize_fn(df.loc[in_context].assign(_row=np.flatnonzero(in_context)))
+            new_cols = [c for c in computed.columns if c not in df.columns and c != "_row"]
+            parts.append(computed.loc[recompute[computed["_row"].to_numpy()]])
+        else:
+            with open(feat_names_path) as f:
+                feat_names = json.load(f)
+        if not recompute.all():
+            if not in_context.any():
+                new_cols = [c for c in stored.columns if c not in _KEY_COLS + _META_COLS]
+            reused = df.loc[~recompute] \
+                .assign(_row=np.flatnonzero(~recompute)) \
+                .merge(stored.drop(columns="_hash"), on=_KEY_COLS, how="left")
+            if standardization is not None:
+                reused = _restandardize(reused, new_cols, standardization)
+            parts.append(reused)
+
+        result = pd.concat(parts, axis=0) \
+            .sort_values(["horizon", "_row"], kind="stable") \
+            .reset_index(drop=True)
+
+        # update the store, keeping groups that were not in `df`
+        updated = result[_KEY_COLS + new_cols].assign(_hash=row_hash[result["_row"].to_numpy()])
+        if standardization is not None:
+            scale, center = _standardization_factors(result, standardization)
+            updated = updated.assign(_scale=scale, _center=center)
+        if stored is not None:
+            other_groups = stored.merge(df[_GROUP_COLS].drop_duplicates(), on=_GROUP_COLS,
+                                        how="left", indicator=True)["_merge"] == "left_only"
+            updated = pd.concat([updated, stored.loc[other_groups.to_numpy(), updated.columns]], axis=0)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write(feat_names_path, lambda path: path.write_text(json.dumps(feat_names)))
+        atomic_write(features_path, lambda path: updated.to_parquet(path, index=False))
+
+        return result[list(df.columns) + new_cols], feat_names
+
+
+    def _store_dir(self, key):
+        description = json.dumps({"namespace": self.namespace, "key": key}, sort_keys=True, default=str)
+        return self.root / hashlib.sha256(description.encode()).hexdigest()
+
+
+    def _first_changed_pos(self, df, row_hash, stored):
+        """
+        For each row of `df`, the position within its group of the first row
+        that is new, revised or follows a removed row, or infinity if there
+        is no such row.
+        """
+        if stored is None:
+            return np.zeros(df.shape[0])
+
+        comparison = df[_KEY_COLS] \
+            .assign(_hash=row_hash) \
+            .merge(stored[_KEY_COLS + ["_hash"]].drop_duplicates(_KEY_COLS),
+                   on=_KEY_COLS, how="outer", suffixes=("", "_stored"), indicator=True)
+        changed = (comparison["_merge"] != "both") | (comparison["_hash"] != comparison["_hash_stored"])
+        first_changed_date = comparison.loc[changed] \
+            .groupby(_GROUP_COLS)["wk_end_date"] \
+            .min() \
+            .rename("_first_changed_date") \
+            .reset_index()
+
+        first_changed_date = df[_GROUP_COLS] \
+            .merge(first_changed_date, on=_GROUP_COLS, how="left")["_first_changed_date"] \
+            .to_numpy()
+        is_before = pd.Series(df["wk_end_date"].to_numpy() < first_changed_date)
+        n_before = is_before.groupby([df[c] for c in _GROUP_COLS], sort=False).transform("sum").to_numpy()
+
+        return np.where(pd.isna(first_changed_date), np.inf, n_before)
+
+
+def _restandardize(reused, new_cols, standardization):
+    """
+    Transform stored features of reused rows, in columns "_scale" and
+    "_center" with the factors they were computed with, to the current
+    standardization factors. With standardized data `x = value / scale -
+    center`, data standardized with the stored factors map to the current
+    factors by `a * x + b`.
+    """
+    scale, center = _standardization_factors(reused, standardization)
+    a = reused["_scale"].to_numpy() / scale
+    b = a * reused["_center"].to_numpy() - center
+    for c in new_cols:
+        kind = standardization["kind"](c)
+        if kind == "affine":
+            reused[c] = a * reused[c].to_numpy() + b
+        elif kind == "scale":
+            reused[c] = a * reused[c].to_numpy()
+
+    return reused.drop(columns=["_scale", "_center"])
+
+
+def _standardization_factors(df, standardization):
+    scale = df[standardization["scale"]].to_numpy() + standardization.get("scale_offset", 0.0)
+    return scale, df[standardization["center"]].to_numpy()
@@ -1,16 +1,81 @@
 import calendar
+import copy
+import functools
+import os
+import warnings
 
-import lightgbm as lgb
 import numpy as np
 import pandas as pd
-from iddata.loader import DiseaseDataLoader
-from tqdm.autonotebook import tqdm
 
+from idmodels.booster_store import BoosterStore, fingerprint
+from idmodels.data_cache import cached_load_data
+from idmodels.feature_store import FeatureStore
+from idmodels.postprocess import (
+    build_hub_quantile_df,
+    get_inv_power,
+    interpolate_quantiles,
+    invert_transforms,
+    quantile_noncrossing,
+)
 from idmodels.preprocess import create_features_and_targets
-from idmodels.utils import build_save_path
+from idmodels.profiling import run_profiler, save_profile, stage
+from idmodels.utils import imap_ordered, save_predictions, save_table, worker_pool
+
+# model config settings that do not affect the trained models
+_RUNTIME_SETTINGS = {"num_workers", "lgb_num_threads", "location_workers", "location_backend",
+                     "noncrossing_method", "booster_store", "warm_start_rounds"}
 
 
 class GBQRModel():
+    """
+    Gradient boosting quantile regression model.
+    
+    In addition to the required settings, `model_config` may specify:
+    - num_workers: number of threads used to fit bags in parallel. Default,
+      1, fits bags serially.
+    - lgb_num_threads: number of threads used by LightGBM within each model
+      fit. Default, None, splits the CPU cores among the `num_workers` bag
+      workers, `max(1, os.cpu_count() // num_workers)` threads each, if
+      `num_workers` is more than 1, and otherwise uses the LightGBM default.
+    - shared_dataset: if True, bin the training features once per run and
+      train on row subsets of that binned dataset, so that all quantile
+      models in a bag share one dataset construction. Bin boundaries are
+      then computed from all training data rather than from each bag, so
+      predictions differ slightly from the default, False.
+    - location_workers: if `fit_locations_separately` is True, number of
+      workers used to fit locations in parallel. Default, 1, fits locations
+      serially.
+    - location_backend: "thread" (default) or "process", the kind of worker
+      pool used to fit locations in parallel.
+    - noncrossing_method: "sort" (default) or "isotonic", how predictions
+      are adjusted to prevent quantile crossing.
+    - categorical_feats: if True, pass data source, agg_level, and location
+      to LightGBM as categorical features rather than one-hot encodings.
+      Default False.
+    - booster_store: None (default), "save", "reuse" or "warm_start". If
+      not None, trained boosters are saved under the run's
+      `artifact_store_root`, keyed by model config, bag and quantile level.
+      With "reuse", a stored booster trained on the same inputs is used
+      without refitting. With "warm_start", in addition, a stored booster
+      trained on other inputs, e.g. an earlier week's data, is the
+      starting point for `warm_start_rounds` (default 10) further boosting
+      rounds on the current data instead of training from scratch. Warm
+      starts always begin from the base booster trained from scratch, which
+      is kept as is, so boosters never grow beyond the base booster plus
+      `warm_start_rounds` trees; a run with "save" refits the base boosters.
+      The categories of categorical features are part of the store key, so
+      that stored trees are only used with the same category codes.
+    - anchor_q_levels: optional subset of `run_config.q_levels`. If given,
+      models are only fit for these levels, and predictions at the other
+      levels are interpolated from the median predictions across bags; see
+      `postprocess.interpolate_quantiles`. Default, None, fits all levels.
+    - bag_tol: if not None, the number of bags is adaptive: bags are fit
+      until the largest change in the median test set predictions across
+      bags, on the scale of the model's target, stays below `bag_tol` for
+      `bag_patience` (default 3) consecutive bags, fitting at least
+      `min_bags` (default 10) and at most `num_bags` bags. The number of
+      bags used is saved in the run metadata. Default None uses `num_bags`.
+    """
     def __init__(self, model_config):
         self.model_config = model_config
     
@@ -19,11 +84,39 @@ class GBQRModel():
         """
         Load flu data, generate predictions from a gbqr model, and save them as a csv file.
         
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run. If
+          `profile` is True, the time and memory used by each stage of the
+          run are saved in the artifact store; a `profile_hook` function is
+          called with the record of each stage. See `profiling.StageProfiler`.
+        """
+        profiler = run_profiler(run_config)
+        with stage(profiler, "load"):
+            df = self.load_data(run_config, as_of=run_config.ref_date)
+        with stage(profiler, "featurize"):
+            data = self.prepare_data(run_config, df)
+        preds_df = self.predict(run_config, data, profiler=profiler)
+        with stage(profiler, "write"):
+            save_predictions(preds_df, run_config, self.model_config)
+        save_profile(profiler, run_config, self.model_config)
+    
+    
+    def load_data(self, run_config, as_of):
+        """
+        Load data for the sources specified in the model config.
+        
         Parameters
         ----------
         run_config: configuration object with settings for the run
+        as_of: date of the nhsn data vintage to load, or None to load the
+          latest vintage
+        
+        Returns
+        -------
+        Pandas data frame with one row per combination of source, location
+        and week
         """
-        # load flu data
         if self.model_config.reporting_adj:
             ilinet_kwargs = None
             flusurvnet_kwargs = None
@@ -31,65 +124,146 @@ class GBQRModel():
             ilinet_kwargs = {"scale_to_positive": False}
             flusurvnet_kwargs = {"burden_adj": False}
         
+        # heavy dependencies are imported where they are used, so that
+        # importing this module is fast
+        from iddata.loader import DiseaseDataLoader
+        
         fdl = DiseaseDataLoader()
-        df = fdl.load_data(nhsn_kwargs={"as_of": run_config.ref_date, "disease": run_config.disease},
-                           ilinet_kwargs=ilinet_kwargs,
-                           flusurvnet_kwargs=flusurvnet_kwargs,
-                           sources=self.model_config.sources,
-                           power_transform=self.model_config.power_transform)
+        df = cached_load_data(fdl, run_config,
+                              nhsn_kwargs={"as_of": as_of, "disease": run_config.disease},
+                              ilinet_kwargs=ilinet_kwargs,
+                              flusurvnet_kwargs=flusurvnet_kwargs,
+                              sources=self.model_config.sources,
+                              power_transform=self.model_config.power_transform)
         if run_config.locations is not None:
             df = df.loc[df["location"].isin(run_config.locations)]
         
-        # augment data with features and target values
+        return df
+    
+    
+    def prepare_data(self, run_config, df):
+        """
+        Augment data with features and target values. The result does not
+        depend on the reference date, so it can be shared by predictions for
+        several reference dates.
+        
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        df: data frame returned by `load_data`
+        
+        Returns
+        -------
+        tuple with the augmented data frame and a list of feature names
+        """
         if run_config.disease == "flu":
             init_feats = ["inc_trans_cs", "season_week", "log_pop"]
         elif run_config.disease == "covid":
             init_feats = ["inc_trans_cs", "log_pop"]
         
+        feature_store_root = getattr(run_config, "feature_store_root", None)
+        if feature_store_root is not None:
+            feature_store = FeatureStore(
+                feature_store_root,
+                namespace={"disease": run_config.disease,
+                           "sources": self.model_config.sources,
+                           "power_transform": self.model_config.power_transform,
+                           "reporting_adj": self.model_config.reporting_adj})
+        else:
+            feature_store = None
+        
         df, feat_names = create_features_and_targets(
             df = df,
             incl_level_feats=self.model_config.incl_level_feats,
             max_horizon=run_config.max_horizon,
-            curr_feat_names=init_feats)
+            curr_feat_names=init_feats,
+            feature_store=feature_store,
+            categorical=getattr(self.model_config, "categorical_feats", False))
         
         # keep only rows that are in-season
         if run_config.disease == "flu":
             df = df.query("season_week >= 5 and season_week <= 45")
         
-        # "test set" df used to generate look-ahead predictions
-        df_test = df.loc[df.wk_end_date == df.wk_end_date.max()] \
-            .copy()
+        return df, feat_names
+    
+    
+    def predict(self, run_config, data, last_obs_date=None, profiler=None):
+        """
+        Train the model and generate predictions for the reference date in
+        the run config.
+        
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        data: tuple returned by `prepare_data`
+        last_obs_date: optional date of the last observation available at
+          the reference date. If provided, later observations are masked:
+          rows after this date are dropped, and training targets falling
+          after it are treated as missing. Default, None, uses all data.
+        profiler: optional StageProfiler recording the stages of the run
         
-        # "train set" df for model fitting; target value non-missing
-        df_train = df.loc[~df["delta_target"].isna().values]
+        Returns
+        -------
+        Pandas data frame with predictions in FluSight hub format. With an
+        adaptive number of bags, `attrs["metadata"]` records the number of
+        bags used, per location if locations are fit separately.
+        """
+        df, feat_names = data
+        with stage(profiler, "split"):
+            if last_obs_date is not None:
+                last_obs_date = pd.Timestamp(last_obs_date)
+                df = df.loc[(df["wk_end_date"] <= last_obs_date).values]
+                target_date = df["wk_end_date"] + pd.to_timedelta(7 * df["horizon"], unit="D")
+                df = df.assign(delta_target=df["delta_target"].where(target_date <= last_obs_date))
+            
+            # "test set" df used to generate look-ahead predictions
+            df_test = df.loc[df.wk_end_date == df.wk_end_date.max()] \
+                .copy()
+            
+            # "train set" df for model fitting; target value non-missing
+            df_train = df.loc[~df["delta_target"].isna().values]
         
         # train model and obtain test set predictinos
         if self.model_config.fit_locations_separately:
+            # partition by location once, keeping locations in the order in
+            # which they appear in the test set
             locations = df_test["location"].unique()
-            preds_df = [
-                self._train_gbq_and_predict(
-                    run_config,
-                    df_train, df_test, feat_names, location
-                ) for location in locations
-            ]
-            preds_df = pd.concat(preds_df, axis=0)
+            train_inds = df_train.groupby("location", sort=False).indices
+            test_inds = df_test.groupby("location", sort=False).indices
+            location_dfs = (
+                (df_train.iloc[train_inds.get(location, [])], df_test.iloc[test_inds[location]])
+                for location in locations
+            )
+            
+            location_workers = getattr(self.model_config, "location_workers", 1)
+            location_backend = getattr(self.model_config, "location_backend", "thread")
+            # stages run in worker processes are not recorded
+            location_profiler = None if location_backend == "process" else profiler
+            with worker_pool(location_workers, location_backend) as executor:
+                location_preds = list(imap_ordered(
+                    functools.partial(_train_location, self, run_config, feat_names, location_profiler),
+                    location_dfs, executor, max_pending=2 * (location_workers or 1)))
+            preds_df = pd.concat(location_preds, axis=0)
+            num_bags_used = {
+                location: location_preds_df.attrs["num_bags_used"]
+                for location, location_preds_df in zip(locations, location_preds)
+            }
         else:
             preds_df = self._train_gbq_and_predict(
                 run_config,
-                df_train, df_test, feat_names
+                df_train, df_test, feat_names,
+                profiler=profiler
             )
+            num_bags_used = preds_df.attrs.pop("num_bags_used")
         
-        # save
-        save_path = build_save_path(
-            root=run_config.output_root,
-            run_config=run_config,
-            model_config=self.model_config
-        )
-        preds_df.to_csv(save_path, index=False)
+        if getattr(self.model_config, "bag_tol", None) is not None:
+            preds_df.attrs["metadata"] = {"num_bags_used": num_bags_used}
+        
+        return preds_df
 
 
     def _train_gbq_and_predict(self, run_config,
-                               df_train, df_test, feat_names, location = None):
+                               df_train, df_test, feat_names, profiler = None):
         """
         Train gbq model and get predictions on the original target scale,
         formatted in the FluSight hub format.
@@ -100,73 +274,70 @@ class GBQRModel():
         df_train: data frame with training data
         df_test: data frame with test data
         feat_names: list of names of columns with features
-        location: optional string of location to fit to. Default, None, fits to all locations
+        profiler: optional StageProfiler recording the stages of the run
         
         Returns
         -------
         Pandas data frame with test set predictions in FluSight hub format
         """
-        # filter to location if necessary
-        if location is not None:
-            df_test = df_test.query(f'location == "{location}"')
-            df_train = df_train.query(f'location == "{location}"')
-        
         # get x and y
-        x_test = df_test[feat_names]
-        x_train = df_train[feat_names]
-        y_train = df_train["delta_target"]
+        with stage(profiler, "feature_matrix"):
+            x_test = _feature_matrix(df_test, feat_names)
+            x_train = _feature_matrix(df_train, feat_names)
+            y_train = df_train["delta_target"].to_numpy()
         
         # test set predictions:
         # same number of rows as df_test, one column per quantile level
         test_pred_qs_df = self._get_test_quantile_predictions(
             run_config,
-            df_train, x_train, y_train, x_test
+            df_train, x_train, y_train, x_test, feat_names,
+            profiler=profiler
         )
         
-        # add predictions to original test df
-        df_test.reset_index(drop=True, inplace=True)
-        df_test_w_preds = pd.concat([df_test, test_pred_qs_df], axis=1)
-        
-        # melt to get columns into rows, keeping only the things we need to invert data
-        # transforms later on
-        cols_to_keep = ["source", "location", "wk_end_date", "pop",
-                        "inc_trans_cs", "horizon",
-                        "inc_trans_center_factor", "inc_trans_scale_factor"]
-        preds_df = df_test_w_preds[cols_to_keep + run_config.q_labels]
-        preds_df = preds_df.loc[(preds_df["source"] == "nhsn")]
-        preds_df = pd.melt(preds_df,
-                        id_vars=cols_to_keep,
-                        var_name="quantile",
-                        value_name = "delta_hat")
-        
-        # build data frame with predictions on the original scale
-        preds_df["inc_trans_cs_target_hat"] = preds_df["inc_trans_cs"] + preds_df["delta_hat"]
-        preds_df["inc_trans_target_hat"] = (preds_df["inc_trans_cs_target_hat"] + preds_df["inc_trans_center_factor"]) * (preds_df["inc_trans_scale_factor"] + 0.01)
-        if self.model_config.power_transform == "4rt":
-            inv_power = 4
-        elif self.model_config.power_transform is None:
-            inv_power = 1
-        else:
-            raise ValueError('unsupported power_transform: must be "4rt" or None')
-        
-        preds_df["value"] = (np.maximum(preds_df["inc_trans_target_hat"], 0.0) ** inv_power - 0.01 - 0.75**4) * preds_df["pop"] / 100000
-        preds_df["value"] = np.maximum(preds_df["value"], 0.0)
-        
-        # get predictions into the format needed for FluSight hub submission
-        preds_df = self._format_as_flusight_output(preds_df, run_config.ref_date, run_config.disease)
+        with stage(profiler, "postprocess"):
+            # keep only the test instances for the nhsn source, which are our
+            # forecast targets, and the things we need to invert data transforms
+            is_nhsn = (df_test["source"] == "nhsn").to_numpy()
+            df_nhsn = df_test.loc[is_nhsn]
+            delta_hat = test_pred_qs_df.to_numpy()[is_nhsn]
+            
+            # build predictions on the original scale:
+            # one row per nhsn test instance, one column per quantile level
+            value = invert_transforms(
+                inc_trans_cs_hat=df_nhsn["inc_trans_cs"].to_numpy()[:, None] + delta_hat,
+                center=df_nhsn["inc_trans_center_factor"].to_numpy()[:, None],
+                scale=df_nhsn["inc_trans_scale_factor"].to_numpy()[:, None],
+                pop=df_nhsn["pop"].to_numpy()[:, None],
+                inv_power=get_inv_power(self.model_config.power_transform),
+                scale_offset=0.01)
+            
+            # get predictions into the format needed for FluSight hub submission,
+            # with rows for all test instances at the first quantile level, then
+            # the second quantile level, and so on
+            n_q_levels = len(run_config.q_labels)
+            preds_df = build_hub_quantile_df(
+                location=np.tile(df_nhsn["location"].to_numpy(), n_q_levels),
+                wk_end_date=np.tile(df_nhsn["wk_end_date"].to_numpy(), n_q_levels),
+                horizon=np.tile(df_nhsn["horizon"].to_numpy(), n_q_levels),
+                output_type_id=np.repeat(run_config.q_labels, df_nhsn.shape[0]),
+                value=value.T.ravel(),
+                ref_date=run_config.ref_date,
+                disease=run_config.disease)
         
         # sort quantiles to avoid quantile crossing
-        preds_df = self._quantile_noncrossing(
-            preds_df,
-            gcols = ["location", "reference_date", "horizon", "target_end_date",
-                    "target", "output_type"]
-        )
+        with stage(profiler, "noncrossing"):
+            preds_df = self._quantile_noncrossing(
+                preds_df,
+                gcols = ["location", "reference_date", "horizon", "target_end_date",
+                        "target", "output_type"]
+            )
+        preds_df.attrs["num_bags_used"] = test_pred_qs_df.attrs["num_bags_used"]
         
         return preds_df
 
 
     def _get_test_quantile_predictions(self, run_config,
-                                       df_train, x_train, y_train, x_test):
+                                       df_train, x_train, y_train, x_test, feat_names, profiler=None):
         """
         Train the model on bagged subsets of the training data and obtain
         quantile predictions. This is the heart of the method.
@@ -178,90 +349,435 @@ class GBQRModel():
         x_train: numpy array with training instances in rows, features in columns
         y_train: numpy array with target values
         x_test: numpy array with test instances in rows, features in columns
+        feat_names: list of names of features, corresponding to the columns of
+          `x_train` and `x_test`
+        profiler: optional StageProfiler recording the stages of the run
         
         Returns
         -------
         Pandas data frame with test set predictions. The number of rows matches
         the number of rows of `x_test`. The number of columns matches the number
         of quantile levels for predictions as specified in the `run_config`.
-        Column names are given by `run_config.q_labels`.
+        Column names are given by `run_config.q_labels`. The number of bags
+        the predictions are based on is recorded in `attrs["num_bags_used"]`.
         """
+        import lightgbm as lgb
+        from tqdm.autonotebook import tqdm
+        
         # seed for random number generation, based on reference date
         rng_seed = int(calendar.timegm(run_config.ref_date.timetuple()))
         rng = np.random.default_rng(seed=rng_seed)
         # seeds for lgb model fits, one per combination of bag and quantile level
         lgb_seeds = rng.integers(1e8, size=(self.model_config.num_bags, len(run_config.q_levels)))
         
+        # quantile levels to fit models for; models at anchor levels use the
+        # same seeds as when fitting all levels
+        fit_q_inds = self._fit_q_inds(run_config)
+        fit_run_config = copy.copy(run_config)
+        fit_run_config.q_levels = [run_config.q_levels[i] for i in fit_q_inds]
+        
+        # indices of features with a pandas categorical dtype, which are
+        # encoded as integer codes in `x_train` and `x_test`
+        categorical_feature = [
+            j for j, feat in enumerate(feat_names)
+            if isinstance(df_train[feat].dtype, pd.CategoricalDtype)
+        ]
+        
         # training loop over bags
-        test_preds_by_bag = np.empty((x_test.shape[0], self.model_config.num_bags, len(run_config.q_levels)))
+        test_preds_by_bag = np.empty((x_test.shape[0], self.model_config.num_bags, len(fit_q_inds)))
         
-        train_seasons = df_train["season"].unique()
+        # row indices of the training instances in each season, so that a bag
+        # can be assembled without scanning the season column
+        season_codes, train_seasons = pd.factorize(df_train["season"])
+        season_rows = np.split(np.argsort(season_codes, kind="stable"),
+                               np.cumsum(np.bincount(season_codes))[:-1])
         
-        feat_importance = list()
+        # feature importance scores by bag, quantile level and feature, if
+        # they are saved
+        if run_config.save_feat_importance:
+            importance_type = getattr(run_config, "feat_importance_type", "split")
+            feat_importance = np.zeros((self.model_config.num_bags, len(fit_q_inds), len(feat_names)),
+                                       dtype=np.float64 if importance_type == "gain" else np.int64)
+        else:
+            importance_type = None
+            feat_importance = None
+        
+        if getattr(self.model_config, "shared_dataset", False):
+            # bin features once; bags are row subsets sharing these bins.
+            # Continuing training from a stored booster requires the raw
+            # data, to compute the booster's predictions for the bag
+            train_set = lgb.Dataset(x_train, label=y_train,
+                                    categorical_feature=list(categorical_feature) or "auto",
+                                    params=self._lgb_params(verbosity=-1),
+                                    free_raw_data=getattr(self.model_config, "booster_store", None) != "warm_start") \
+                .construct()
+        else:
+            train_set = None
         
-        for b in tqdm(range(self.model_config.num_bags), "Bag number"):
-            # get indices of observations that are in bag
-            bag_seasons = rng.choice(
-                train_seasons,
-                size = int(len(train_seasons) * self.model_config.bag_frac_samples),
-                replace=False)
-            bag_obs_inds = df_train["season"].isin(bag_seasons)
-            
-            for q_ind, q_level in enumerate(run_config.q_levels):
-                # fit to bag
-                model = lgb.LGBMRegressor(
-                    verbosity=-1,
-                    objective="quantile",
-                    alpha=q_level,
-                    random_state=lgb_seeds[b, q_ind])
-                model.fit(X=x_train.loc[bag_obs_inds, :], y=y_train.loc[bag_obs_inds])
-
-                feat_importance.append(
-                    pd.DataFrame({
-                        "feat": x_train.columns,
-                        "importance": model.feature_importances_,
-                        "b": b,
-                        "q_level": q_level
-                    })
-                )
+        booster_store = self._booster_store(run_config, df_train)
+        if booster_store is not None:
+            # the inputs to a bag's model fits are identified by this digest
+            # of all training data together with the bag's row indices
+            train_digest = fingerprint(x_train, y_train, feat_names)
+        else:
+            train_digest = None
+        
+        def bag_obs_inds_generator():
+            # bags are drawn in order, so that the draws do not depend on
+            # how the model fits are scheduled
+            for b in range(self.model_config.num_bags):
+                # get indices of observations that are in bag, in their
+                # original order
+                bag_season_inds = rng.choice(
+                    len(train_seasons),
+                    size = int(len(train_seasons) * self.model_config.bag_frac_samples),
+                    replace=False)
+                yield b, np.sort(np.concatenate([season_rows[i] for i in bag_season_inds]))
+        
+        def fit_bag(bag):
+            b, bag_obs_inds = bag
+            return self._fit_bag(fit_run_config, x_train, y_train, x_test, feat_names,
+                                 bag_obs_inds, lgb_seeds[b, fit_q_inds], b, train_set,
+                                 categorical_feature, booster_store, train_digest, profiler, importance_type)
+        
+        # adaptive number of bags: stop once the median across bags has
+        # changed by less than `bag_tol` for `bag_patience` consecutive bags
+        bag_tol = getattr(self.model_config, "bag_tol", None)
+        min_bags = getattr(self.model_config, "min_bags", 10)
+        bag_patience = getattr(self.model_config, "bag_patience", 3)
+        num_bags_used = self.model_config.num_bags
+        num_stable_bags = 0
+        running_median = None
+        
+        num_workers = getattr(self.model_config, "num_workers", 1)
+        with worker_pool(num_workers) as executor:
+            bag_results = imap_ordered(fit_bag, bag_obs_inds_generator(), executor,
+                                       max_pending=2 * (num_workers or 1))
+            for b, (bag_test_preds, bag_feat_importance) in enumerate(
+                    tqdm(bag_results, "Bag number", total=self.model_config.num_bags)):
+                test_preds_by_bag[:, b, :] = bag_test_preds
+                if feat_importance is not None:
+                    feat_importance[b] = bag_feat_importance
                 
-                # test set predictions
-                test_preds_by_bag[:, b, q_ind] = model.predict(X=x_test)
+                if bag_tol is not None:
+                    median = np.median(test_preds_by_bag[:, :b + 1, :], axis=1)
+                    if running_median is not None and \
+                            np.max(np.abs(median - running_median), initial=0.0) < bag_tol:
+                        num_stable_bags += 1
+                    else:
+                        num_stable_bags = 0
+                    running_median = median
+                    if b + 1 >= min_bags and num_stable_bags >= bag_patience:
+                        num_bags_used = b + 1
+                        break
+            
+            # cancel bags that were submitted but not started
+            bag_results.close()
         
-        # combine and save feature importance scores
-        if run_config.save_feat_importance:
-            feat_importance = pd.concat(feat_importance, axis=0)
-            save_path = build_save_path(
-                root=run_config.artifact_store_root,
-                run_config=run_config,
-                model_config=self.model_config,
-                subdir="feat_importance")
-            feat_importance.to_csv(save_path, index=False)
+        if feat_importance is not None:
+            self._save_feat_importance(run_config, feat_importance[:num_bags_used], fit_run_config.q_levels,
+                                       feat_names)
         
         # combined predictions across bags: median
-        test_pred_qs = np.median(test_preds_by_bag, axis=1)
+        with stage(profiler, "combine_bags"):
+            test_pred_qs = np.median(test_preds_by_bag[:, :num_bags_used, :], axis=1)
+            if len(fit_q_inds) < len(run_config.q_levels):
+                test_pred_qs = interpolate_quantiles(fit_run_config.q_levels, test_pred_qs, run_config.q_levels)
         
         # test predictions as a data frame, one column per quantile level
         test_pred_qs_df = pd.DataFrame(test_pred_qs)
         test_pred_qs_df.columns = run_config.q_labels
+        test_pred_qs_df.attrs["num_bags_used"] = num_bags_used
         
         return test_pred_qs_df
 
 
-    def _format_as_flusight_output(self, preds_df, ref_date, disease):
-        # keep just required columns and rename to match hub format
-        preds_df = preds_df[["location", "wk_end_date", "horizon", "quantile", "value"]] \
-            .rename(columns={"quantile": "output_type_id"})
+    def _fit_bag(self, run_config, x_train, y_train, x_test, feat_names,
+                 bag_obs_inds, bag_lgb_seeds, b, train_set=None, categorical_feature=(),
+                 booster_store=None, train_digest=None, profiler=None, importance_type=None):
+        """
+        Fit one model per quantile level to a single bag of the training data,
+        and obtain test set predictions from those models.
+        
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        x_train: numpy array with training instances in rows, features in columns
+        y_train: numpy array with target values
+        x_test: numpy array with test instances in rows, features in columns
+        feat_names: list of names of features
+        bag_obs_inds: numpy array with row indices of training instances in the bag
+        bag_lgb_seeds: array of seeds for lgb model fits, one per quantile level
+        b: bag number
+        train_set: optional lgb.Dataset with all training instances. If
+          provided, models are trained on a subset of it rather than on
+          `x_train` and `y_train`.
+        categorical_feature: indices of columns of `x_train` with categorical features
+        booster_store: optional BoosterStore in which to persist the trained
+          boosters, and from which to reuse or warm-start them
+        train_digest: fingerprint of all training data, required if
+          `booster_store` is provided
+        profiler: optional StageProfiler recording the stages of the run
+        importance_type: "split", "gain", or None (default) to skip
+          computing feature importance scores
+        
+        Returns
+        -------
+        tuple with:
+        - numpy array of test set predictions, with one row per row of `x_test`
+          and one column per quantile level
+        - numpy array of feature importance scores, with one row per quantile
+          level and one column per feature, or None if `importance_type` is None
+        """
+        import lightgbm as lgb
+        
+        test_preds = np.empty((x_test.shape[0], len(run_config.q_levels)))
+        if importance_type is not None:
+            feat_importance = np.empty((len(run_config.q_levels), len(feat_names)),
+                                       dtype=np.float64 if importance_type == "gain" else np.int64)
+        else:
+            feat_importance = None
+        
+        # shared by the models for all quantile levels
+        if train_set is not None:
+            bag_train_set = train_set.subset(bag_obs_inds)
+            # lgb.train must be told about categorical features that the
+            # subset inherits from `train_set`; see below
+            train_kwargs = {"categorical_feature": list(categorical_feature)} if categorical_feature else {}
+        else:
+            x_bag = x_train[bag_obs_inds]
+            y_bag = y_train[bag_obs_inds]
+        
+        for q_ind, q_level in enumerate(run_config.q_levels):
+            model = None
+            init_model = None
+            booster = None
+            if booster_store is not None:
+                booster_name = f"b{b}-q{q_level}"
+                bag_fingerprint = fingerprint(train_digest, bag_obs_inds, q_level, int(bag_lgb_seeds[q_ind]))
+                model, init_model = self._load_booster(booster_store, booster_name, bag_fingerprint)
+            
+            with stage(profiler, "fit", b=b, q_level=q_level):
+                # fit to bag, unless a stored booster was trained on the same inputs
+                if model is None and train_set is not None:
+                    # LightGBM 4.5 deprecates the categorical_feature argument
+                    # of lgb.train in favor of setting it on the Dataset. But
+                    # `train_set` has freed its raw data, and training on its
+                    # subset with the argument omitted or set through params
+                    # raises "Cannot set categorical feature after freed raw
+                    # data", so the argument is still needed and only its
+                    # deprecation warning is ignored
+                    with warnings.catch_warnings():
+                        warnings.filterwarnings("ignore", message="Argument 'categorical_feature' to train",
+                                                category=FutureWarning)
+                        model = lgb.train(
+                            params=self._lgb_params(
+                                verbosity=-1,
+                                objective="quantile",
+                                alpha=q_level,
+                                seed=bag_lgb_seeds[q_ind]),
+                            train_set=bag_train_set,
+                            init_model=init_model,
+                            **self._warm_start_kwargs(init_model, "num_boost_round"),
+                            **train_kwargs)
+                    booster = model
+                elif model is None:
+                    model = lgb.LGBMRegressor(
+                        verbosity=-1,
+                        objective="quantile",
+                        alpha=q_level,
+                        random_state=bag_lgb_seeds[q_ind],
+                        n_jobs=self._lgb_num_threads(),
+                        **self._warm_start_kwargs(init_model, "n_estimators"))
+                    model.fit(X=x_bag, y=y_bag, categorical_feature=list(categorical_feature),
+                              init_model=init_model)
+                    booster = model.booster_
+            
+            if booster_store is not None and booster is not None:
+                # a warm started booster is kept alongside its base booster
+                booster_store.save(booster_name if init_model is None else f"{booster_name}-warm",
+                                   booster, bag_fingerprint)
+            
+            if feat_importance is not None:
+                # `model` is a Booster unless it was fit as an LGBMRegressor
+                feat_importance[q_ind] = (model if booster is None else booster) \
+                    .feature_importance(importance_type=importance_type)
+            
+            # test set predictions
+            with stage(profiler, "predict", b=b, q_level=q_level):
+                test_preds[:, q_ind] = model.predict(x_test)
+        
+        return test_preds, feat_importance
+
+
+    def _save_feat_importance(self, run_config, feat_importance, q_levels, feat_names):
+        """
+        Save feature importance scores in the "feat_importance" subdirectory
+        of the artifact store, as a long table with one row per combination
+        of bag, quantile level and feature, in the run config's
+        `artifact_format` (see `utils.save_table`). If the run config sets
+        `feat_importance_summary` to a list of levels, the mean and those
+        quantiles of the scores across bags are also saved, in the
+        "feat_importance_summary" subdirectory.
         
-        preds_df["target_end_date"] = preds_df["wk_end_date"] + pd.to_timedelta(7*preds_df["horizon"], unit="days")
-        preds_df["reference_date"] = ref_date
-        preds_df["horizon"] = (pd.to_timedelta(preds_df["target_end_date"].dt.date - ref_date).dt.days / 7).astype(int)
-        preds_df["target"] = "wk inc " + disease + " hosp"
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        feat_importance: numpy array of scores with shape (number of bags,
+          number of quantile levels, number of features)
+        q_levels: quantile levels of the fitted models
+        feat_names: list of names of features
+        """
+        num_bags, num_q_levels, num_feats = feat_importance.shape
+        save_kwargs = {
+            "root": run_config.artifact_store_root,
+            "run_config": run_config,
+            "model_config": self.model_config,
+            "output_format": getattr(run_config, "artifact_format", "csv"),
+            "partition": getattr(run_config, "partition_output", False)
+        }
+        
+        save_table(pd.DataFrame({
+                       "feat": np.tile(feat_names, num_bags * num_q_levels),
+                       "importance": feat_importance.ravel(),
+                       "b": np.repeat(np.arange(num_bags), num_q_levels * num_feats),
+                       "q_level": np.tile(np.repeat(q_levels, num_feats), num_bags)
+                   }),
+                   subdir="feat_importance",
+                   **save_kwargs)
+        
+        summary_q_levels = getattr(run_config, "feat_importance_summary", None)
+        if summary_q_levels is not None:
+            summary = pd.DataFrame({
+                "feat": np.tile(feat_names, num_q_levels),
+                "q_level": np.repeat(q_levels, num_feats),
+                "mean": feat_importance.mean(axis=0).ravel()
+            })
+            bag_quantiles = np.quantile(feat_importance, summary_q_levels, axis=0)
+            for q, values in zip(summary_q_levels, bag_quantiles):
+                summary[f"q{q}"] = values.ravel()
+            save_table(summary, subdir="feat_importance_summary", **save_kwargs)
+    
+    
+    def _fit_q_inds(self, run_config):
+        """
+        Indices of the quantile levels in `run_config.q_levels` that models
+        are fit for: all of them, or those in `anchor_q_levels` if the model
+        config specifies them.
+        """
+        anchor_q_levels = getattr(self.model_config, "anchor_q_levels", None)
+        if anchor_q_levels is None:
+            return list(range(len(run_config.q_levels)))
         
-        preds_df["output_type"] = "quantile"
-        preds_df.drop(columns="wk_end_date", inplace=True)
+        if not set(anchor_q_levels) <= set(run_config.q_levels):
+            raise ValueError("anchor_q_levels must be a subset of run_config.q_levels")
         
-        return preds_df
+        return [i for i, q_level in enumerate(run_config.q_levels) if q_level in anchor_q_levels]
+    
+    
+    def _booster_store(self, run_config, df_train):
+        """
+        BoosterStore for the model fits of this run, or None if boosters are
+        not persisted. Boosters are keyed by the model config, apart from
+        settings that only affect how work is scheduled, by the run settings
+        that determine the training data, and by the categories of
+        categorical features, whose integer codes the trees split on.
+        """
+        mode = getattr(self.model_config, "booster_store", None)
+        if mode is None:
+            return None
+        if mode not in ("save", "reuse", "warm_start"):
+            raise ValueError('unsupported booster_store: must be None, "save", "reuse" or "warm_start"')
+        
+        if self.model_config.fit_locations_separately:
+            fit_locations = df_train["location"].unique().tolist()
+        else:
+            fit_locations = None
+        key = {
+            "model_config": {k: v for k, v in vars(self.model_config).items() if k not in _RUNTIME_SETTINGS},
+            "disease": run_config.disease,
+            "locations": run_config.locations,
+            "max_horizon": run_config.max_horizon,
+            "fit_locations": fit_locations,
+            "categories": {
+                c: df_train[c].cat.categories.tolist()
+                for c in df_train.columns if isinstance(df_train[c].dtype, pd.CategoricalDtype)
+            }
+        }
+        return BoosterStore(run_config.artifact_store_root / f"UMass-{self.model_config.model_name}" / "boosters",
+                            key)
+    
+    
+    def _load_booster(self, booster_store, booster_name, bag_fingerprint):
+        """
+        Look up a stored booster according to the `booster_store` setting.
+        
+        Returns
+        -------
+        tuple with:
+        - a booster to use as is, if one was trained on the same inputs and
+          stored boosters are reused; otherwise None
+        - a booster to continue training from, if stored boosters are warm
+          started and there is a base booster trained on other inputs;
+          otherwise None
+        """
+        if self.model_config.booster_store == "save":
+            return None, None
+        
+        if self.model_config.booster_store == "warm_start":
+            booster, stored_fingerprint = booster_store.load(f"{booster_name}-warm")
+            if booster is not None and stored_fingerprint == bag_fingerprint:
+                return booster, None
+        
+        booster, stored_fingerprint = booster_store.load(booster_name)
+        if booster is None:
+            return None, None
+        elif stored_fingerprint == bag_fingerprint:
+            return booster, None
+        elif self.model_config.booster_store == "warm_start":
+            return None, booster
+        else:
+            return None, None
+    
+    
+    def _warm_start_kwargs(self, init_model, rounds_arg):
+        """
+        Number of boosting rounds to add when continuing training from
+        `init_model`, as a keyword argument named `rounds_arg`. Empty when
+        training from scratch, so that the LightGBM default applies.
+        """
+        if init_model is None:
+            return {}
+        
+        return {rounds_arg: getattr(self.model_config, "warm_start_rounds", 10)}
+    
+    
+    def _lgb_params(self, **params):
+        """
+        Parameters for lgb.Dataset and lgb.train, adding the LightGBM thread
+        budget if one applies.
+        """
+        lgb_num_threads = self._lgb_num_threads()
+        if lgb_num_threads is not None:
+            params["num_threads"] = lgb_num_threads
+        
+        return params
+    
+    
+    def _lgb_num_threads(self):
+        """
+        Number of threads used by LightGBM within each model fit: the
+        `lgb_num_threads` setting, or by default an equal share of the CPU
+        cores for each bag worker if bags are fit in parallel, so that the
+        workers do not compete for the same cores. None means the LightGBM
+        default.
+        """
+        lgb_num_threads = getattr(self.model_config, "lgb_num_threads", None)
+        num_workers = getattr(self.model_config, "num_workers", 1) or 1
+        if lgb_num_threads is None and num_workers > 1:
+            lgb_num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        
+        return lgb_num_threads
 
 
     def _quantile_noncrossing(self, preds_df, gcols):
@@ -278,9 +794,54 @@ class GBQRModel():
         -------
         Sorted version of preds_df, guaranteed not to have quantile crossing
         """
-        g = preds_df.set_index(gcols).groupby(gcols)
-        preds_df = g[["output_type_id", "value"]] \
-            .transform(lambda x: x.sort_values()) \
-            .reset_index()
-        
-        return preds_df
+        return quantile_noncrossing(
+            preds_df, gcols,
+            method=getattr(self.model_config, "noncrossing_method", "sort"))
+
+
+def _train_location(model, run_config, feat_names, profiler, location_dfs):
+    """
+    Train gbq model and get predictions for a single location. Defined at
+    module level so that it can be sent to a process pool.
+    
+    Parameters
+    ----------
+    model: GBQRModel
+    run_config: configuration object with settings for the run
+    feat_names: list of names of columns with features
+    profiler: optional StageProfiler recording the stages of the run
+    location_dfs: tuple of data frames with training and test data for the location
+    
+    Returns
+    -------
+    Pandas data frame with test set predictions in FluSight hub format
+    """
+    df_train, df_test = location_dfs
+    return model._train_gbq_and_predict(run_config, df_train, df_test, feat_names, profiler=profiler)
+
+
+def _feature_matrix(df, feat_names):
+    """
+    Extract features as a C-contiguous float32 numpy array, filled one column
+    at a time to avoid a full-size float64 copy of the data frame. Features
+    with a pandas categorical dtype are represented by their integer codes,
+    with missing values as NaN.
+    
+    Parameters
+    ----------
+    df: data frame with features in columns
+    feat_names: list of names of columns with features
+    
+    Returns
+    -------
+    numpy array with one row per row of `df` and one column per feature
+    """
+    x = np.empty((df.shape[0], len(feat_names)), dtype=np.float32)
+    for j, feat in enumerate(feat_names):
+        if isinstance(df[feat].dtype, pd.CategoricalDtype):
+            codes = df[feat].cat.codes.to_numpy()
+            x[:, j] = np.where(codes < 0, np.nan, codes)
+        else:
+            x[:, j] = df[feat].to_numpy(dtype=np.float32, na_value=np.nan)
+    
+    return x
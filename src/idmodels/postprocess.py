@@ -0,0 +1,223 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+
+def quantile_noncrossing(preds_df, gcols, method="sort"):
+    """
+    Adjust predictions to be in alignment with quantile levels, to prevent
+    quantile crossing.
+
+    Predictions are arranged in a dense array with one row per group and one
+    column per quantile level, and adjusted along the quantile axis in a
+    single vectorized operation. Within each group, the i-th row of
+    `preds_df` is assigned the i-th smallest "output_type_id" and the i-th
+    adjusted value.
+
+    Parameters
+    ----------
+    preds_df: data frame with quantile predictions in columns "output_type_id"
+      and "value"
+    gcols: columns to group by; predictions will be adjusted within those groups
+    method: "sort" (default) to rearrange predictions in increasing order, or
+      "isotonic" to replace predictions with their least squares isotonic
+      regression on the quantile levels
+
+    Returns
+    -------
+    Data frame with columns `gcols`, "output_type_id" and "value", with rows
+    in the same order as `preds_df`, guaranteed not to have quantile crossing
+    """
+    g = preds_df.groupby(gcols, sort=False)
+    group = g.ngroup().to_numpy()
+    pos = g.cumcount().to_numpy()
+    shape = (group.max() + 1, pos.max() + 1) if len(preds_df) > 0 else (0, 0)
+
+    # dense [group, quantile] arrays; padding for groups with fewer quantile
+    # levels sorts last
+    labels = preds_df["output_type_id"].to_numpy()
+    if np.issubdtype(labels.dtype, np.number):
+        labels_by_group = np.full(shape, np.nan)
+    else:
+        labels = labels.astype(str)
+        labels_by_group = np.full(shape, "\U0010ffff", dtype=labels.dtype)
+    labels_by_group[group, pos] = labels
+    values_by_group = np.full(shape, np.nan)
+    values_by_group[group, pos] = preds_df["value"].to_numpy()
+
+    label_order = np.argsort(labels_by_group, axis=1, kind="stable")
+    labels_by_group = np.take_along_axis(labels_by_group, label_order, axis=1)
+    if method == "sort":
+        values_by_group = np.sort(values_by_group, axis=1)
+    elif method == "isotonic":
+        if np.any(np.isnan(values_by_group)):
+            raise ValueError("isotonic noncrossing requires the same quantile levels in every group")
+        values_by_group = _isotonic_rows(np.take_along_axis(values_by_group, label_order, axis=1))
+    else:
+        raise ValueError('unsupported method: must be "sort" or "isotonic"')
+
+    result = preds_df[gcols].reset_index(drop=True)
+    result["output_type_id"] = labels_by_group[group, pos]
+    result["value"] = values_by_group[group, pos]
+
+    return result
+
+
+def _isotonic_rows(y):
+    """
+    Least squares isotonic regression of each row of `y` on its column index,
+    using the min-max formula fit_j = max_{i <= j} min_{k >= j} mean(y[i:k+1]).
+
+    Parameters
+    ----------
+    y: 2d numpy array
+
+    Returns
+    -------
+    numpy array of the same shape as `y`, non-decreasing along each row
+    """
+    n_cols = y.shape[1]
+    i = np.arange(n_cols)[:, None]
+    k = np.arange(n_cols)[None, :]
+
+    # means[:, i, k] is the mean of y[:, i:k+1], for i <= k
+    csum = np.concatenate([np.zeros((y.shape[0], 1)), np.cumsum(y, axis=1)], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = (csum[:, None, 1:] - csum[:, :-1, None]) / (k - i + 1)
+    means[:, np.arange(n_cols), np.arange(n_cols)] = y
+    means = np.where(k >= i, means, np.inf)
+
+    # min over k >= j, then max over i <= j
+    suffix_min = np.flip(np.minimum.accumulate(np.flip(means, axis=2), axis=2), axis=2)
+    suffix_min = np.where(i <= k, suffix_min, -np.inf)
+
+    return suffix_min.max(axis=1)
+
+
+def interpolate_quantiles(anchor_q_levels, anchor_values, q_levels):
+    """
+    Interpolate predictions at a subset of quantile levels to a full set of
+    quantile levels.
+
+    Anchor predictions are sorted, then interpolated linearly in the
+    quantile levels' standard normal scores, extrapolating beyond the
+    outermost anchors with the slope of the outermost pair. The result is
+    non-decreasing in the quantile level, exact at the anchor levels, and
+    exact at all levels when the predictive distribution is normal, which
+    gives more sensible tails than interpolating in the levels themselves.
+
+    Parameters
+    ----------
+    anchor_q_levels: increasing list of at least two quantile levels,
+      strictly between 0 and 1
+    anchor_values: numpy array of predictions with one row per instance and
+      one column per anchor quantile level
+    q_levels: list of quantile levels to interpolate to, strictly between 0 and 1
+
+    Returns
+    -------
+    numpy array of predictions with one row per instance and one column per
+    entry of `q_levels`
+    """
+    if len(anchor_q_levels) < 2:
+        raise ValueError("at least two anchor quantile levels are required")
+
+    std_normal = NormalDist()
+    anchor_z = np.array([std_normal.inv_cdf(q) for q in anchor_q_levels])
+    z = np.array([std_normal.inv_cdf(q) for q in q_levels])
+
+    # index of the anchor segment used for each level, with levels outside
+    # the anchors using the outermost segments
+    i = np.clip(np.searchsorted(anchor_z, z, side="right") - 1, 0, len(anchor_z) - 2)
+    w = (z - anchor_z[i]) / (anchor_z[i + 1] - anchor_z[i])
+
+    anchor_values = np.sort(anchor_values, axis=1)
+    return (1 - w) * anchor_values[:, i] + w * anchor_values[:, i + 1]
+
+
+def get_inv_power(power_transform, square_fallback=False):
+    """
+    Power that inverts the power transform applied to surveillance signals.
+
+    Parameters
+    ----------
+    power_transform: "4rt" or None
+    square_fallback: if True, treat any other value of `power_transform` as
+      a square root transform, as the SARIX model does. Otherwise, other
+      values raise an error.
+
+    Returns
+    -------
+    integer power
+    """
+    if power_transform == "4rt":
+        return 4
+    elif square_fallback:
+        return 2
+    elif power_transform is None:
+        return 1
+    else:
+        raise ValueError('unsupported power_transform: must be "4rt" or None')
+
+
+def invert_transforms(inc_trans_cs_hat, center, scale, pop, inv_power, scale_offset=0.0):
+    """
+    Map predictions of the centered and scaled, power transformed signal back
+    to counts on the original scale. Arguments are numpy arrays that
+    broadcast against each other, e.g. `inc_trans_cs_hat` with shape
+    [location, quantile] and the others with shape [location, 1].
+
+    Parameters
+    ----------
+    inc_trans_cs_hat: predictions on the centered and scaled transformed scale
+    center: centering factors, "inc_trans_center_factor"
+    scale: scaling factors, "inc_trans_scale_factor"
+    pop: population sizes
+    inv_power: power inverting the power transform, see `get_inv_power`
+    scale_offset: offset added to the scaling factors
+
+    Returns
+    -------
+    numpy array of non-negative predictions on the original scale
+    """
+    inc_trans_hat = (inc_trans_cs_hat + center) * (scale + scale_offset)
+    value = (np.maximum(inc_trans_hat, 0.0) ** inv_power - 0.01 - 0.75**4) * pop / 100000
+    return np.maximum(value, 0.0)
+
+
+def build_hub_quantile_df(location, wk_end_date, horizon, output_type_id, value, ref_date, disease):
+    """
+    Assemble quantile predictions in the format needed for FluSight hub
+    submission. All array arguments have one entry per prediction.
+
+    Parameters
+    ----------
+    location: array of locations
+    wk_end_date: array of dates of the last observation the predictions are based on
+    horizon: array of forecast horizons relative to `wk_end_date`, in weeks
+    output_type_id: array of quantile labels
+    value: array of predictions
+    ref_date: reference date for the forecasts
+    disease: "flu" or "covid"
+
+    Returns
+    -------
+    Pandas data frame with columns "location", "horizon", "output_type_id",
+    "value", "target_end_date", "reference_date", "target" and "output_type".
+    Horizons are relative to `ref_date`.
+    """
+    target_end_date = np.asarray(wk_end_date, dtype="datetime64[ns]") + \
+        (7 * np.asarray(horizon, dtype=np.int64)).astype("timedelta64[D]")
+    days_ahead = (target_end_date - np.datetime64(ref_date, "D")) // np.timedelta64(1, "D")
+
+    return pd.DataFrame({
+        "location": location,
+        "horizon": (days_ahead / 7).astype(int),
+        "output_type_id": output_type_id,
+        "value": value,
+        "target_end_date": target_end_date,
+        "reference_date": ref_date,
+        "target": "wk inc " + disease + " hosp",
+        "output_type": "quantile"
+    })
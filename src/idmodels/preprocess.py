@@ -1,11 +1,19 @@
 import fnmatch
+import functools
 
 import pandas as pd
-from iddata.utils import get_holidays
-from timeseriesutils import featurize
 
+# number of preceding rows within a combination of source and location that
+# features computed by _featurize_groups depend on: the longest trailing
+# window (6 rows) less the current row, plus the longest lag (2 rows)
+_FEATURE_LOOKBACK = 7
 
-def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_names = []):
+# increment when changing _featurize_groups, to invalidate feature stores
+_FEATURE_VERSION = 2
+
+
+def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_names = [],
+                                feature_store = None, categorical = False):
     '''
     Create features and targets for prediction
     
@@ -19,6 +27,15 @@ def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_nam
       maximum forecast horizon
     curr_feat_names: list of strings
       list of names of columns in `df` containing existing features
+    feature_store: FeatureStore or None
+      optional store of previously computed features. If provided, features
+      and targets are only computed for rows whose windows include new or
+      revised data, and rows are ordered by horizon, then by the order of
+      the rows of `df`
+    categorical: boolean
+      encode data source, agg_level, and location as categorical features,
+      in columns "source_cat", "agg_level_cat" and "location_cat" with a
+      pandas categorical dtype, rather than as one-hot encodings?
     
     Returns
     -------
@@ -31,13 +48,18 @@ def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_nam
     # current features; will be updated
     feat_names = curr_feat_names
     
-    # one-hot encodings of data source, agg_level, and location
+    # one-hot or categorical encodings of data source, agg_level, and location
     for c in ["source", "agg_level", "location"]:
-        ohe = pd.get_dummies(df[c], prefix=c)
-        df = pd.concat([df, ohe], axis=1)
-        feat_names = feat_names + list(ohe.columns)
+        if categorical:
+            df = df.assign(**{f"{c}_cat": df[c].astype("category")})
+            feat_names = feat_names + [f"{c}_cat"]
+        else:
+            ohe = pd.get_dummies(df[c], prefix=c)
+            df = pd.concat([df, ohe], axis=1)
+            feat_names = feat_names + list(ohe.columns)
     
     # season week relative to christmas
+    from iddata.utils import get_holidays
     df = df.merge(
             get_holidays() \
                 .query("holiday == 'Christmas Day'") \
@@ -49,6 +71,54 @@ def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_nam
     
     feat_names = feat_names + ["delta_xmas"]
     
+    # features summarizing data within each combination of source and location,
+    # and forecast targets
+    if feature_store is None:
+        df, new_feat_names = _featurize_groups(df, max_horizon)
+    else:
+        df, new_feat_names = feature_store.featurize(
+            df,
+            featurize_fn=functools.partial(_featurize_groups, max_horizon=max_horizon),
+            key={"version": _FEATURE_VERSION, "max_horizon": max_horizon},
+            value_cols=["inc_trans"],
+            lookback=_FEATURE_LOOKBACK,
+            lookahead=max_horizon,
+            standardization={"scale": "inc_trans_scale_factor", "scale_offset": 0.01,
+                             "center": "inc_trans_center_factor", "kind": _standardization_kind})
+    feat_names = feat_names + new_feat_names
+    
+    # we will model the differences between the prediction target and the most
+    # recent observed value
+    df["delta_target"] = df["inc_trans_cs_target"] - df["inc_trans_cs"]
+    
+    # if requested, drop features that involve absolute level
+    if not incl_level_feats:
+        feat_names = _drop_level_feats(feat_names)
+    
+    return df, feat_names
+
+
+def _featurize_groups(df, max_horizon):
+    '''
+    Compute features summarizing data within each combination of source and
+    location, and forecast targets
+    
+    Parameters
+    ----------
+    df: pandas dataframe
+      data frame with data to "featurize"
+    max_horizon: int
+      maximum forecast horizon
+    
+    Returns
+    -------
+    tuple with:
+    - the input data frame, augmented with additional columns with feature and
+      target values, with one row per combination of input row and horizon
+    - a list of the names of the new features
+    '''
+    from timeseriesutils import featurize
+    
     # features summarizing data within each combination of source and location
     df, new_feat_names = featurize.featurize_data(
         df, group_columns=["source", "location"],
@@ -82,7 +152,7 @@ def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_nam
                 }
             }
         ])
-    feat_names = feat_names + new_feat_names
+    feat_names = new_feat_names
     
     df, new_feat_names = featurize.featurize_data(
         df, group_columns=["source", "location"],
@@ -111,17 +181,20 @@ def create_features_and_targets(df, incl_level_feats, max_horizon, curr_feat_nam
         ])
     feat_names = feat_names + new_feat_names
     
-    # we will model the differences between the prediction target and the most
-    # recent observed value
-    df["delta_target"] = df["inc_trans_cs_target"] - df["inc_trans_cs"]
-    
-    # if requested, drop features that involve absolute level
-    if not incl_level_feats:
-        feat_names = _drop_level_feats(feat_names)
-    
     return df, feat_names
 
 
+def _standardization_kind(feat_name):
+    # how a feature changes when inc_trans_cs changes by a * x + b: Taylor
+    # coefficients of degree 1 and higher are slopes, scaled by a, and all
+    # other features of inc_trans_cs are levels
+    if not feat_name.startswith("inc_trans_cs"):
+        return None
+    if fnmatch.fnmatch(feat_name, "*taylor_d?_c[1-9]*"):
+        return "scale"
+    return "affine"
+
+
 def _drop_level_feats(feat_names):
     level_feats = ["inc_trans_cs", "inc_trans_cs_lag1", "inc_trans_cs_lag2"] + \
                   fnmatch.filter(feat_names, "*taylor_d?_c0*") + \
@@ -0,0 +1,141 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from idmodels.utils import build_save_path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class StageProfiler():
+    """
+    Records the wall time, CPU time and peak resident set size (RSS) of the
+    stages of a model run.
+
+    CPU time is that of the whole process, so for stages that run
+    concurrently, e.g. bag fits in a thread pool, it includes the work of
+    the other stages running at the same time. Peak RSS is the largest RSS
+    of the process up to the end of the stage, in MiB, and is missing where
+    the `resource` module is not available. Stages run in worker processes
+    are not recorded.
+
+    Parameters
+    ----------
+    hook: optional function called with the record of each stage, a
+      dictionary, as soon as the stage ends. It may be called from several
+      threads at once.
+    """
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.records = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+
+    @contextlib.contextmanager
+    def stage(self, name, **labels):
+        """
+        Context manager recording a stage.
+
+        Parameters
+        ----------
+        name: name of the stage, e.g. "load" or "fit"
+        **labels: further fields identifying the stage, e.g. the bag number
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "stage": name,
+                **labels,
+                "start": wall_start - self._start,
+                "wall_time": time.perf_counter() - wall_start,
+                "cpu_time": time.process_time() - cpu_start,
+                "peak_rss_mb": _peak_rss_mb()
+            }
+            with self._lock:
+                self.records.append(record)
+            if self.hook is not None:
+                self.hook(record)
+
+
+    def to_frame(self):
+        """
+        Recorded stages as a data frame, one row per stage in order of completion.
+        """
+        with self._lock:
+            return pd.DataFrame.from_records(self.records)
+
+
+    def save(self, json_path, csv_path):
+        """
+        Save the recorded stages in JSON and CSV formats.
+
+        Parameters
+        ----------
+        json_path: path of the JSON file, with the records and the number of
+          CPUs available
+        csv_path: path of the CSV file, with one row per stage
+        """
+        with self._lock:
+            records = list(self.records)
+        json_path.write_text(json.dumps({"cpu_count": os.cpu_count(), "stages": records}, indent=2, default=str))
+        pd.DataFrame.from_records(records).to_csv(csv_path, index=False)
+
+
+def stage(profiler, name, **labels):
+    """
+    Context manager recording a stage with `profiler`, or doing nothing if
+    `profiler` is None.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+
+    return profiler.stage(name, **labels)
+
+
+def run_profiler(run_config):
+    """
+    StageProfiler for a run, if the run config sets `profile` to True or
+    provides a `profile_hook`; otherwise None.
+    """
+    hook = getattr(run_config, "profile_hook", None)
+    if not getattr(run_config, "profile", False) and hook is None:
+        return None
+
+    return StageProfiler(hook=hook)
+
+
+def save_profile(profiler, run_config, model_config):
+    """
+    Save the stages recorded by `profiler` in the "profile" subdirectory of
+    the artifact store, as JSON and CSV files, if the run config sets
+    `profile` to True.
+    """
+    if profiler is None or not getattr(run_config, "profile", False):
+        return
+
+    profiler.save(
+        json_path=build_save_path(root=run_config.artifact_store_root, run_config=run_config,
+                                  model_config=model_config, subdir="profile", ext="json"),
+        csv_path=build_save_path(root=run_config.artifact_store_root, run_config=run_config,
+                                 model_config=model_config, subdir="profile", ext="csv"))
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
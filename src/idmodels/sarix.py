@@ -1,25 +1,121 @@
 
+import functools
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-from iddata.loader import DiseaseDataLoader
-from iddata.utils import get_holidays
-from sarix import sarix
 
-from idmodels.utils import build_save_path
+from idmodels.batching import SeriesBatch
+from idmodels.data_cache import cached_load_data
+from idmodels.postprocess import build_hub_quantile_df, get_inv_power, invert_transforms
+from idmodels.profiling import run_profiler, save_profile, stage
+from idmodels.utils import atomic_write, build_save_path, imap_ordered, save_predictions, worker_pool
 
 
 class SARIXModel():
+    """
+    Seasonal autoregressive model with exogenous covariates, fit with SARIX.
+
+    In addition to the required settings, `model_config` may specify:
+    - posterior_store: if True, posterior predictive samples are copied,
+      `quantile_chunk_size` locations at a time, to a memory-mapped .npy
+      file in the "posterior" subdirectory of the run's
+      `artifact_store_root`, and quantiles are computed from that file one
+      chunk of locations at a time, so that the memory used for quantile
+      extraction does not grow with the number of locations. The samples
+      can be read back with `load_posterior_samples`. Default False.
+    - quantile_chunk_size: number of locations per chunk with a posterior
+      store. Default 8.
+    - parallel_chains: if True, expose `run_config.num_chains` host CPU
+      devices to JAX so that MCMC chains run in parallel rather than one
+      after another. This only takes effect in processes in which JAX has
+      not yet been initialized. Default False.
+    - location_workers: if `theta_pooling` and `sigma_pooling` are both
+      "none", so that locations share no parameters, the locations are
+      split into this many shards that are fit independently in parallel
+      and recombined before quantile extraction. Each shard's fit draws
+      its own random numbers, so samples differ from those of a single
+      fit. Default, 1, fits all locations together.
+    - location_backend: the kind of worker pool used to fit shards of
+      locations. Only "process" (default) is supported, with processes
+      started by the "spawn" method, since JAX does not support forked
+      processes. SARIX fits within one process run one at a time, so
+      threads could not fit shards in parallel.
+    - compilation_cache: if True, JAX keeps compiled programs, such as the
+      NUTS sampler, in a persistent cache in the "jax_cache" subdirectory
+      of the run's `artifact_store_root`, so that later runs and other
+      model variants with the same array shapes skip compilation. This
+      only takes effect in processes in which JAX has not yet compiled
+      anything. Default False.
+    - time_bucket: if set, the oldest weeks of the series are dropped so
+      that their length is a multiple of this many weeks. The array shapes
+      then only change every `time_bucket` weeks, so that the compiled
+      sampler can be reused from week to week. Default None uses all weeks.
+    - mcmc_warm_start: if True, the final state of the NUTS sampler (step
+      size, inverse mass matrix and last draw) is saved in the
+      "sampler_state" subdirectory of the run's `artifact_store_root`, and
+      a run is initialized from the state saved by the latest earlier
+      reference date for the same model structure, if any, with
+      `warm_start_num_warmup` (default `run_config.num_warmup`) warmup
+      steps. Locations are then fit together. Default False.
+    - mcmc_diagnostics: if True, or with a warm start, the largest split
+      R-hat and smallest effective sample size of each parameter are saved
+      in the run metadata. Default False.
+
+    With a warm start or diagnostics, SARIX is fit in a separate process.
+    SARIX creates its sampler internally, with no way to pass in an initial
+    state or to retrieve the sampler afterwards, so the sampler classes of
+    the sarix module are replaced for the fit; doing so in a process of its
+    own leaves other fits in this process unaffected.
+    """
     def __init__(self, model_config):
         self.model_config = model_config
 
     def run(self, run_config):
+        profiler = run_profiler(run_config)
+        with stage(profiler, "load"):
+            df = self.load_data(run_config, as_of=run_config.ref_date)
+        with stage(profiler, "featurize"):
+            df = self.prepare_data(run_config, df)
+        preds_df = self.predict(run_config, df, profiler=profiler)
+        with stage(profiler, "write"):
+            save_predictions(preds_df, run_config, self.model_config)
+        save_profile(profiler, run_config, self.model_config)
+
+    def load_data(self, run_config, as_of):
+        """
+        Load data for the sources specified in the model config.
+
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        as_of: date of the nhsn data vintage to load, or None to load the
+          latest vintage
+        """
+        # heavy dependencies are imported where they are used, so that
+        # importing this module is fast
+        from iddata.loader import DiseaseDataLoader
+
         fdl = DiseaseDataLoader()
-        df = fdl.load_data(nhsn_kwargs={"as_of": run_config.ref_date, "disease": run_config.disease},
-                           sources=self.model_config.sources,
-                           power_transform=self.model_config.power_transform)
+        df = cached_load_data(fdl, run_config,
+                              nhsn_kwargs={"as_of": as_of, "disease": run_config.disease},
+                              sources=self.model_config.sources,
+                              power_transform=self.model_config.power_transform)
         if run_config.locations is not None:
             df = df.loc[df["location"].isin(run_config.locations)]
 
+        return df
+
+    def prepare_data(self, run_config, df):
+        """
+        Add covariates to data returned by `load_data`. The result does not
+        depend on the reference date.
+        """
+        from iddata.utils import get_holidays
+
         # season week relative to christmas
         df = df.merge(
             get_holidays() \
@@ -30,70 +126,416 @@ class SARIXModel():
             on="season") \
         .assign(delta_xmas = lambda x: x["season_week"] - x["xmas_week"])
         df["xmas_spike"] = np.maximum(3 - np.abs(df["delta_xmas"]), 0)
-        
-        xy_colnames = self.model_config.x + ["inc_trans_cs"]
-        df = df.query("wk_end_date >= '2022-10-01'").interpolate()
-        batched_xy = df[xy_colnames].values.reshape(len(df["location"].unique()), -1, len(xy_colnames))
-        
-        sarix_fit_all_locs_theta_pooled = sarix.SARIX(
-            xy = batched_xy,
-            p = self.model_config.p,
-            d = self.model_config.d,
-            P = self.model_config.P,
-            D = self.model_config.D,
-            season_period = self.model_config.season_period,
-            transform="none", # transformations are handled outside of SARIX
-            theta_pooling=self.model_config.theta_pooling,
-            sigma_pooling=self.model_config.sigma_pooling,
-            forecast_horizon = run_config.max_horizon,
-            num_warmup = run_config.num_warmup,
-            num_samples = run_config.num_samples,
-            num_chains = run_config.num_chains
-        )
-
-        pred_qs = _np_percentile(sarix_fit_all_locs_theta_pooled.predictions[..., :, :, 0],
-                                 np.array(run_config.q_levels) * 100, axis=0)
-        
-        df_nhsn_last_obs = df.groupby(["location"]).tail(1)
-        
-        preds_df = pd.concat([
-            pd.DataFrame(pred_qs[i, :, :]) \
-            .set_axis(df_nhsn_last_obs["location"], axis="index") \
-            .set_axis(np.arange(1, run_config.max_horizon+1), axis="columns") \
-            .assign(output_type_id = q_label) \
-            for i, q_label in enumerate(run_config.q_labels)
-        ]) \
-        .reset_index() \
-        .melt(["location", "output_type_id"], var_name="horizon") \
-        .merge(df_nhsn_last_obs, on="location", how="left")
-        
-        # build data frame with predictions on the original scale
-        preds_df["value"] = (preds_df["value"] + preds_df["inc_trans_center_factor"]) * preds_df["inc_trans_scale_factor"]
-        if self.model_config.power_transform == "4rt":
-            preds_df["value"] = np.maximum(preds_df["value"], 0.0) ** 4
+
+        return df
+
+    def predict(self, run_config, df, last_obs_date=None, profiler=None):
+        """
+        Fit the model and generate predictions for the reference date in the
+        run config.
+
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        df: data frame returned by `prepare_data`
+        last_obs_date: optional date of the last observation available at
+          the reference date; later rows are dropped. Default, None, uses
+          all data.
+        profiler: optional StageProfiler recording the stages of the run
+
+        Returns
+        -------
+        Pandas data frame with predictions in FluSight hub format
+        """
+        with stage(profiler, "split"):
+            if last_obs_date is not None:
+                df = df.loc[(df["wk_end_date"] <= pd.Timestamp(last_obs_date)).values]
+
+            xy_colnames = self.model_config.x + ["inc_trans_cs"]
+            df = df.query("wk_end_date >= '2022-10-01'")
+            batch = SeriesBatch(df, xy_colnames)
+            batched_xy = batch.values
+
+            time_bucket = getattr(self.model_config, "time_bucket", None)
+            if time_bucket is not None and batched_xy.shape[1] >= time_bucket:
+                batched_xy = batched_xy[:, batched_xy.shape[1] % time_bucket:, :]
+
+        with stage(profiler, "fit"):
+            predictions, mcmc_metadata = self._fit_predictions(run_config, batched_xy)
+
+        with stage(profiler, "predict"):
+            if getattr(self.model_config, "posterior_store", False):
+                samples = self._save_posterior(run_config, predictions, batch.locations)
+                # release the in-memory samples before quantile extraction
+                del predictions
+                pred_qs = self._chunked_percentile(samples, np.array(run_config.q_levels) * 100)
+            else:
+                pred_qs = _np_percentile(predictions[..., :, :, 0],
+                                         np.array(run_config.q_levels) * 100, axis=0)
+
+        with stage(profiler, "postprocess"):
+            # scaling factors from the last row for each location, in the
+            # order of the batch; forecasts are relative to the last date of
+            # the batch, which series that end early were extended to
+            df_nhsn_last_obs = df.groupby(["location"], sort=False).tail(1)
+            df_nhsn_last_obs = df_nhsn_last_obs \
+                .iloc[pd.Index(df_nhsn_last_obs["location"]).get_indexer(batch.locations)] \
+                .assign(wk_end_date=batch.dates[-1])
+
+            # long layout of `pred_qs`, which has shape (number of quantile
+            # levels, number of locations, number of horizons): rows are
+            # ordered by horizon, then quantile level, then location
+            n_q_levels, n_locations, n_horizons = pred_qs.shape
+            loc_inds = np.tile(np.arange(n_locations), n_q_levels * n_horizons)
+            horizon = np.repeat(np.arange(1, n_horizons + 1), n_q_levels * n_locations)
+            output_type_id = np.tile(np.repeat(np.asarray(run_config.q_labels, dtype=object), n_locations),
+                                     n_horizons)
+
+            # build data frame with predictions on the original scale
+            value = invert_transforms(
+                inc_trans_cs_hat=pred_qs.transpose(2, 0, 1).ravel(),
+                center=df_nhsn_last_obs["inc_trans_center_factor"].to_numpy()[loc_inds],
+                scale=df_nhsn_last_obs["inc_trans_scale_factor"].to_numpy()[loc_inds],
+                pop=df_nhsn_last_obs["pop"].to_numpy()[loc_inds],
+                inv_power=get_inv_power(self.model_config.power_transform, square_fallback=True))
+
+            # get predictions into the format needed for FluSight hub submission
+            preds_df = build_hub_quantile_df(
+                location=df_nhsn_last_obs["location"].to_numpy()[loc_inds],
+                wk_end_date=df_nhsn_last_obs["wk_end_date"].to_numpy()[loc_inds],
+                horizon=horizon,
+                output_type_id=output_type_id,
+                value=value,
+                ref_date=run_config.ref_date,
+                disease=run_config.disease)
+            preds_df = preds_df[["location", "horizon", "output_type_id", "value",
+                                 "target_end_date", "reference_date", "output_type", "target"]]
+            if mcmc_metadata is not None:
+                preds_df.attrs["metadata"] = {"mcmc": mcmc_metadata}
+
+        return preds_df
+
+    def _fit_predictions(self, run_config, batched_xy):
+        """
+        Fit SARIX to batched series and return its posterior predictive
+        samples, fitting shards of locations in parallel if the model
+        config allows it.
+
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        batched_xy: numpy array with shape (number of locations, number of
+          weeks, number of variables)
+
+        Returns
+        -------
+        tuple with:
+        - array of predictions from SARIX, with shape (number of samples,
+          number of locations, number of horizons, number of variables)
+        - dictionary with MCMC diagnostics and whether the sampler was warm
+          started, or None if neither warm starts nor diagnostics are enabled
+        """
+        sarix_kwargs = {
+            "p": self.model_config.p,
+            "d": self.model_config.d,
+            "P": self.model_config.P,
+            "D": self.model_config.D,
+            "season_period": self.model_config.season_period,
+            "transform": "none", # transformations are handled outside of SARIX
+            "theta_pooling": self.model_config.theta_pooling,
+            "sigma_pooling": self.model_config.sigma_pooling,
+            "forecast_horizon": run_config.max_horizon,
+            "num_warmup": run_config.num_warmup,
+            "num_samples": run_config.num_samples,
+            "num_chains": run_config.num_chains
+        }
+        num_devices = run_config.num_chains if getattr(self.model_config, "parallel_chains", False) else None
+        if getattr(self.model_config, "compilation_cache", False):
+            cache_dir = run_config.artifact_store_root / "jax_cache"
         else:
-            preds_df["value"] = np.maximum(preds_df["value"], 0.0) ** 2
-        
-        preds_df["value"] = (preds_df["value"] - 0.01 - 0.75**4) * preds_df["pop"] / 100000
-        preds_df["value"] = np.maximum(preds_df["value"], 0.0)
-        
-        # keep just required columns and rename to match hub format
-        preds_df = preds_df[["location", "wk_end_date", "horizon", "output_type_id", "value"]]
-        
-        preds_df["target_end_date"] = preds_df["wk_end_date"] + pd.to_timedelta(7*preds_df["horizon"], unit="days")
-        preds_df["reference_date"] = run_config.ref_date
-        preds_df["horizon"] = (pd.to_timedelta(preds_df["target_end_date"].dt.date - run_config.ref_date).dt.days / 7).astype(int)
-        preds_df["output_type"] = "quantile"
-        preds_df["target"] = "wk inc " + run_config.disease + " hosp"
-        preds_df.drop(columns="wk_end_date", inplace=True)
-        
-        # save
-        save_path = build_save_path(
-            root=run_config.output_root,
-            run_config=run_config,
-            model_config=self.model_config
-        )
-        preds_df.to_csv(save_path, index=False)
+            cache_dir = None
+
+        if getattr(self.model_config, "location_backend", "process") != "process":
+            raise ValueError('location_backend must be "process": SARIX fits in one process run one at a time')
+
+        # locations can only be fit separately if they share no parameters
+        location_workers = getattr(self.model_config, "location_workers", 1) or 1
+        if self.model_config.theta_pooling != "none" or self.model_config.sigma_pooling != "none":
+            location_workers = 1
+        num_shards = min(location_workers, batched_xy.shape[0])
+
+        if getattr(self.model_config, "mcmc_warm_start", False) or \
+                getattr(self.model_config, "mcmc_diagnostics", False):
+            return self._fit_tracked(run_config, sarix_kwargs, num_devices, cache_dir, batched_xy)
+
+        if num_shards <= 1:
+            return _fit_sarix(sarix_kwargs, num_devices, cache_dir, batched_xy), None
+
+        with worker_pool(num_shards, "process", mp_context=multiprocessing.get_context("spawn")) as executor:
+            shard_predictions = list(imap_ordered(functools.partial(_fit_sarix, sarix_kwargs, num_devices, cache_dir),
+                                                  np.array_split(batched_xy, num_shards, axis=0),
+                                                  executor, max_pending=num_shards))
+
+        return np.concatenate(shard_predictions, axis=1), None
+
+    def _fit_tracked(self, run_config, sarix_kwargs, num_devices, cache_dir, batched_xy):
+        """
+        Fit SARIX to all locations together, warm starting the sampler from
+        a saved state if enabled, and collect MCMC diagnostics. Arguments
+        and return value are as for `_fit_predictions`.
+        """
+        warm_start = getattr(self.model_config, "mcmc_warm_start", False)
+        # the saved state can only be used for the same parameter shapes
+        structure = {
+            "num_locations": batched_xy.shape[0],
+            "num_vars": batched_xy.shape[2],
+            **{name: getattr(self.model_config, name)
+               for name in ["p", "d", "P", "D", "season_period", "theta_pooling", "sigma_pooling"]}
+        }
+        init_state = self._load_sampler_state(run_config, structure) if warm_start else None
+        if init_state is not None:
+            sarix_kwargs = {**sarix_kwargs,
+                            "num_warmup": getattr(self.model_config, "warm_start_num_warmup", run_config.num_warmup)}
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            predictions, samples, adapt_state = executor.submit(
+                _fit_sarix_tracked, sarix_kwargs, num_devices, cache_dir, init_state, batched_xy).result()
+
+        from numpyro.diagnostics import summary
+
+        diagnostics = {
+            name: {"max_r_hat": float(np.nanmax(site["r_hat"])), "min_n_eff": float(np.nanmin(site["n_eff"]))}
+            for name, site in summary(samples, group_by_chain=True).items()
+        }
+        if warm_start:
+            self._save_sampler_state(run_config, structure, adapt_state, samples)
+
+        return predictions, {
+            "warm_started": init_state is not None,
+            "num_warmup": sarix_kwargs["num_warmup"],
+            "diagnostics": diagnostics
+        }
+
+    def _save_sampler_state(self, run_config, structure, adapt_state, samples):
+        """
+        Save the final step size and inverse mass matrix of a sampler,
+        averaged across chains, and the last draw of the first chain.
+        """
+        num_chains = next(iter(samples.values())).shape[0]
+        inverse_mass_matrix = adapt_state["inverse_mass_matrix"]
+        if not isinstance(inverse_mass_matrix, dict):
+            inverse_mass_matrix = {(): inverse_mass_matrix}
+        imm_keys = list(inverse_mass_matrix)
+
+        arrays = {"step_size": np.mean(adapt_state["step_size"])}
+        for i, key in enumerate(imm_keys):
+            imm = np.asarray(inverse_mass_matrix[key])
+            arrays[f"imm_{i}"] = imm.mean(axis=0) if num_chains > 1 else imm
+        for name, value in samples.items():
+            arrays[f"init_{name}"] = value[0, -1]
+
+        save_path = build_save_path(root=run_config.artifact_store_root, run_config=run_config,
+                                    model_config=self.model_config, subdir="sampler_state", ext="npz")
+
+        def write_arrays(path):
+            with open(path, "wb") as f:
+                np.savez(f, **arrays)
+
+        atomic_write(save_path, write_arrays)
+        atomic_write(save_path.with_suffix(".json"),
+                     lambda path: path.write_text(json.dumps({
+                         "structure": structure,
+                         "inverse_mass_matrix_keys": [list(key) for key in imm_keys],
+                         "sites": list(samples)
+                     }, indent=2)))
+
+    def _load_sampler_state(self, run_config, structure):
+        """
+        Sampler state saved by the latest reference date before that of the
+        run for the same model structure, as a dictionary with the step
+        size, the inverse mass matrix and initial values, or None if there
+        is none.
+        """
+        state_dir = build_save_path(root=run_config.artifact_store_root, run_config=run_config,
+                                    model_config=self.model_config, subdir="sampler_state", ext="npz").parent
+        for json_path in sorted(state_dir.glob(f"*-UMass-{self.model_config.model_name}.json"), reverse=True):
+            # file names start with the reference date in ISO format
+            if json_path.name[:10] >= str(run_config.ref_date):
+                continue
+            manifest = json.loads(json_path.read_text())
+            if manifest["structure"] != structure:
+                continue
+            with np.load(json_path.with_suffix(".npz")) as arrays:
+                imm = {tuple(key): arrays[f"imm_{i}"] for i, key in enumerate(manifest["inverse_mass_matrix_keys"])}
+                return {
+                    "step_size": float(arrays["step_size"]),
+                    "inverse_mass_matrix": imm.get((), imm),
+                    "init_values": {name: arrays[f"init_{name}"] for name in manifest["sites"]}
+                }
+
+        return None
+
+    def _save_posterior(self, run_config, predictions, locations):
+        """
+        Copy posterior predictive samples of the target to a .npy file in the
+        artifact store, one chunk of locations at a time, and describe the
+        axes in a json file alongside it.
+
+        Parameters
+        ----------
+        run_config: configuration object with settings for the run
+        predictions: array of predictions from SARIX, with shape (number of
+          samples, number of locations, number of horizons, number of
+          variables); the target is the first variable
+        locations: locations in the order of the location axis
+
+        Returns
+        -------
+        read-only memory-mapped numpy array of samples, with shape (number of
+        samples, number of locations, number of horizons)
+        """
+        chunk_size = getattr(self.model_config, "quantile_chunk_size", 8)
+        n_samples, n_locations, n_horizons = predictions.shape[:3]
+        save_path = build_save_path(root=run_config.artifact_store_root, run_config=run_config,
+                                    model_config=self.model_config, subdir="posterior", ext="npy")
+
+        def write_samples(path):
+            samples = np.lib.format.open_memmap(path, mode="w+", dtype=predictions.dtype,
+                                                shape=(n_samples, n_locations, n_horizons))
+            for start in range(0, n_locations, chunk_size):
+                samples[:, start:start + chunk_size, :] = predictions[:, start:start + chunk_size, :, 0]
+            samples.flush()
+            del samples
+
+        atomic_write(save_path, write_samples)
+        atomic_write(save_path.with_suffix(".json"),
+                     lambda path: path.write_text(json.dumps({
+                         "axes": ["sample", "location", "horizon"],
+                         "locations": list(locations),
+                         "horizons": list(range(1, n_horizons + 1))
+                     }, indent=2)))
+
+        return np.load(save_path, mmap_mode="r")
+
+    def _chunked_percentile(self, samples, q):
+        """
+        Exact percentiles of samples along the first axis, computed for one
+        chunk of locations at a time.
+        """
+        chunk_size = getattr(self.model_config, "quantile_chunk_size", 8)
+        n_locations = samples.shape[1]
+        pred_qs = np.empty((len(q), n_locations, samples.shape[2]))
+        for start in range(0, n_locations, chunk_size):
+            chunk = np.asarray(samples[:, start:start + chunk_size, :])
+            pred_qs[:, start:start + chunk_size, :] = _np_percentile(chunk, q, axis=0)
+
+        return pred_qs
+
+
+# numpyro keeps its effect handlers on a stack shared by all threads, so
+# models cannot be run concurrently in threads of one process
+_fit_lock = threading.Lock()
+
+
+def _fit_sarix(sarix_kwargs, num_devices, cache_dir, xy):
+    """
+    Fit SARIX to the series in `xy` and return its posterior predictive
+    samples. Defined at module level so that it can be sent to a process
+    pool.
+    """
+    if num_devices is not None:
+        # must precede the initialization of JAX in this process
+        import numpyro
+
+        numpyro.set_host_device_count(num_devices)
+
+    if cache_dir is not None:
+        import jax
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        jax.config.update("jax_compilation_cache_dir", str(cache_dir))
+        # cache all compiled programs, however quick they were to compile
+        jax.config.update("jax_persistent_cache_min_compile_time_secs", 0)
+
+    from sarix import sarix
+
+    with _fit_lock:
+        return sarix.SARIX(xy=xy, **sarix_kwargs).predictions
+
+
+def _fit_sarix_tracked(sarix_kwargs, num_devices, cache_dir, init_state, xy):
+    """
+    Fit SARIX as `_fit_sarix` does, initializing the sampler from
+    `init_state` if given. The NUTS and MCMC classes of the sarix module
+    are replaced for the fit, so this must run in a process of its own; see
+    `SARIXModel`.
+
+    Returns
+    -------
+    tuple with the posterior predictive samples, a dictionary of posterior
+    samples of each parameter grouped by chain, and a dictionary with the
+    final step size and inverse mass matrix of the sampler
+    """
+    from numpyro.infer import init_to_value
+    from sarix import sarix
+
+    nuts_class, mcmc_class = sarix.NUTS, sarix.MCMC
+    mcmcs = []
+
+    def nuts(model, *args, **kwargs):
+        if init_state is not None:
+            kwargs.update(step_size=init_state["step_size"],
+                          inverse_mass_matrix=init_state["inverse_mass_matrix"],
+                          init_strategy=init_to_value(values=init_state["init_values"]))
+        return nuts_class(model, *args, **kwargs)
+
+    def mcmc(*args, **kwargs):
+        mcmcs.append(mcmc_class(*args, **kwargs))
+        return mcmcs[-1]
+
+    sarix.NUTS, sarix.MCMC = nuts, mcmc
+    try:
+        predictions = _fit_sarix(sarix_kwargs, num_devices, cache_dir, xy)
+    finally:
+        sarix.NUTS, sarix.MCMC = nuts_class, mcmc_class
+    if not mcmcs:
+        raise RuntimeError("could not track the MCMC sampler used by SARIX")
+
+    samples = {name: np.asarray(value) for name, value in mcmcs[-1].get_samples(group_by_chain=True).items()}
+    adapt_state = mcmcs[-1].last_state.adapt_state
+    inverse_mass_matrix = adapt_state.inverse_mass_matrix
+    if isinstance(inverse_mass_matrix, dict):
+        inverse_mass_matrix = {key: np.asarray(value) for key, value in inverse_mass_matrix.items()}
+    else:
+        inverse_mass_matrix = np.asarray(inverse_mass_matrix)
+
+    return np.asarray(predictions), samples, {"step_size": np.asarray(adapt_state.step_size),
+                                              "inverse_mass_matrix": inverse_mass_matrix}
+
+
+def load_posterior_samples(run_config, model_config):
+    """
+    Load posterior predictive samples saved by a run with `posterior_store`
+    set, e.g. to build "sample" output types without refitting.
+
+    Parameters
+    ----------
+    run_config: configuration object with settings for the run
+    model_config: configuration object with settings for the model
+
+    Returns
+    -------
+    tuple with:
+    - read-only memory-mapped numpy array of samples on the scale of the
+      model's target, with shape (number of samples, number of locations,
+      number of horizons)
+    - list of locations in the order of the location axis
+    """
+    save_path = build_save_path(root=run_config.artifact_store_root, run_config=run_config,
+                                model_config=model_config, subdir="posterior", ext="npy")
+    axes = json.loads(save_path.with_suffix(".json").read_text())
+
+    return np.load(save_path, mmap_mode="r"), axes["locations"]
 
 
 def _np_percentile(predictions, q_levels, axis):
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+_FORECAST_COLS = ["location", "reference_date", "horizon", "target_end_date"]
+
+
+def wis(preds_df, target_df):
+    """
+    Weighted interval score of quantile predictions, computed as twice the
+    mean quantile (pinball) loss across quantile levels. For a set of
+    central prediction intervals and the median, this equals the weighted
+    interval score with the usual weights alpha / 2.
+
+    Parameters
+    ----------
+    preds_df: data frame with quantile predictions in FluSight hub format
+    target_df: data frame with observed values, with columns "location",
+      "target_end_date" and "observation"
+
+    Returns
+    -------
+    Pandas data frame with one row per forecast with an observation, with
+    columns "location", "reference_date", "horizon", "target_end_date" and
+    "wis"
+    """
+    df = preds_df.assign(target_end_date=pd.to_datetime(preds_df["target_end_date"])) \
+        .merge(target_df[["location", "target_end_date", "observation"]]
+               .assign(target_end_date=lambda x: pd.to_datetime(x["target_end_date"])),
+               on=["location", "target_end_date"], how="inner")
+
+    q_level = df["output_type_id"].astype(float).to_numpy()
+    error = df["observation"].to_numpy() - df["value"].to_numpy()
+    df["wis"] = 2 * np.maximum(q_level * error, (q_level - 1) * error)
+
+    return df.groupby(_FORECAST_COLS, as_index=False, sort=False)["wis"].mean()
+
+
+def compare_wis(preds_by_model, target_df, baseline=None, by=("horizon",)):
+    """
+    Compare the weighted interval scores of several sets of predictions, for
+    example from a model fit at all quantile levels and the same model fit
+    at a subset of anchor levels, over the forecasts that all of them make.
+
+    Parameters
+    ----------
+    preds_by_model: dictionary mapping model names to data frames with
+      quantile predictions in FluSight hub format
+    target_df: data frame with observed values, see `wis`
+    baseline: name of the model that relative scores are computed against.
+      Default, None, uses the first model.
+    by: columns of the forecasts to summarize scores by, in addition to the
+      overall summary
+
+    Returns
+    -------
+    Pandas data frame with columns "model", the `by` columns, "wis" with the
+    mean score, and "relative_wis" with the ratio of the mean score to that
+    of the baseline. Rows for the overall summary have missing `by` values.
+    """
+    if baseline is None:
+        baseline = next(iter(preds_by_model))
+    by = list(by)
+
+    # scores on the forecasts common to all models
+    scores = None
+    for model, preds_df in preds_by_model.items():
+        model_scores = wis(preds_df, target_df).rename(columns={"wis": model})
+        scores = model_scores if scores is None else scores.merge(model_scores, on=_FORECAST_COLS, how="inner")
+    scores = scores.melt(_FORECAST_COLS, var_name="model", value_name="wis")
+
+    summary = pd.concat([
+        scores.groupby(["model"] + by, as_index=False, sort=False)["wis"].mean(),
+        scores.groupby("model", as_index=False, sort=False)["wis"].mean()
+    ], axis=0, ignore_index=True)
+    baseline_wis = summary.loc[summary["model"] == baseline] \
+        .drop(columns="model") \
+        .rename(columns={"wis": "baseline_wis"})
+    summary = summary.merge(baseline_wis, on=by, how="left")
+    summary["relative_wis"] = summary["wis"] / summary["baseline_wis"]
+
+    return summary.drop(columns="baseline_wis")
@@ -2,7 +2,13 @@
 # with updated model_name choices
 # In a future refactor, we should consolidate
 
+import collections
+import contextlib
 import datetime
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 def validate_ref_date(ref_date):
@@ -23,9 +29,189 @@ def validate_ref_date(ref_date):
         raise TypeError("ref_date must be a datetime.date object")
 
 
-def build_save_path(root, run_config, model_config, subdir=None):
+# file extensions of the supported formats for tables of outputs
+OUTPUT_FORMATS = {"csv": "csv", "parquet": "parquet", "arrow": "arrow"}
+
+# columns by which partitioned outputs are split into directories
+_PARTITION_COLS = ["model_id", "reference_date"]
+
+
+def build_save_path(root, run_config, model_config, subdir=None, ext="csv", partition=False):
+    if partition:
+        # hive-style layout, e.g. root/subdir/model_id=UMass-gbqr/reference_date=2024-01-06/part-0.parquet,
+        # which Parquet and Arrow dataset readers recognize
+        save_dir = root
+        if subdir is not None:
+            save_dir = save_dir / subdir
+        save_dir = save_dir / f"model_id=UMass-{model_config.model_name}" / f"reference_date={run_config.ref_date}"
+        save_dir.mkdir(parents=True, exist_ok=True)
+        return save_dir / f"part-0.{ext}"
+    
     save_dir = root / f"UMass-{model_config.model_name}"
     if subdir is not None:
         save_dir = save_dir / subdir
     save_dir.mkdir(parents=True, exist_ok=True)
-    return save_dir / f"{str(run_config.ref_date)}-UMass-{model_config.model_name}.csv"
+    return save_dir / f"{str(run_config.ref_date)}-UMass-{model_config.model_name}.{ext}"
+
+
+def save_table(df, root, run_config, model_config, subdir=None, output_format="csv", partition=False):
+    """
+    Save a data frame of outputs in a columnar or csv format.
+    
+    Parameters
+    ----------
+    df: data frame to save
+    root: root directory, e.g. the model output directory
+    run_config: configuration object with settings for the run
+    model_config: configuration object with settings for the model
+    subdir: optional subdirectory, e.g. "feat_importance"
+    output_format: "csv" (default), "parquet" or "arrow" (Arrow IPC file).
+      In the Parquet and Arrow formats, string columns are dictionary
+      encoded. These formats require the optional dependency pyarrow.
+    partition: if True, save to a hive-style directory partitioned by
+      model_id and reference_date, so that the outputs of many runs can be
+      read back as one dataset, e.g. with `pd.read_parquet(root)`. The
+      partition columns are dropped from the saved data frame.
+    
+    Returns
+    -------
+    path of the saved file
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {list(OUTPUT_FORMATS)}")
+    
+    save_path = build_save_path(root=root, run_config=run_config, model_config=model_config, subdir=subdir,
+                                ext=OUTPUT_FORMATS[output_format], partition=partition)
+    if partition:
+        df = df.drop(columns=[c for c in _PARTITION_COLS if c in df.columns])
+    
+    if output_format == "csv":
+        df.to_csv(save_path, index=False)
+        return save_path
+    
+    import pyarrow as pa
+    
+    # dictionary encode string columns: they hold few distinct values, e.g.
+    # locations, quantile levels and feature names
+    df = df.astype({c: "category" for c in df.columns if df[c].dtype == object})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        
+        pq.write_table(table, save_path)
+    else:
+        with pa.OSFile(str(save_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    
+    return save_path
+
+
+def save_predictions(preds_df, run_config, model_config):
+    """
+    Save predictions in the model output directory, as a hub-compatible csv
+    file unless the run config sets `output_format` to "parquet" or "arrow",
+    partitioned by model and reference date if it sets `partition_output`
+    to True (see `save_table`). Run metadata recorded in
+    `preds_df.attrs["metadata"]`, if any, is saved as a json file in the
+    "metadata" subdirectory of the artifact store.
+    
+    Parameters
+    ----------
+    preds_df: data frame with predictions in FluSight hub format
+    run_config: configuration object with settings for the run
+    model_config: configuration object with settings for the model
+    """
+    save_table(preds_df, root=run_config.output_root, run_config=run_config, model_config=model_config,
+               output_format=getattr(run_config, "output_format", "csv"),
+               partition=getattr(run_config, "partition_output", False))
+    
+    metadata = preds_df.attrs.get("metadata")
+    if metadata is not None:
+        save_path = build_save_path(
+            root=run_config.artifact_store_root,
+            run_config=run_config,
+            model_config=model_config,
+            subdir="metadata",
+            ext="json")
+        save_path.write_text(json.dumps(metadata, indent=2, default=str))
+
+
+def atomic_write(path, write_fn):
+    """
+    Write a file so that concurrent readers never see it partially written:
+    `write_fn` is called with a temporary path in the same directory, which
+    then replaces `path`.
+    
+    Parameters
+    ----------
+    path: pathlib.Path of the file to write
+    write_fn: function writing to the path it is given
+    """
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def worker_pool(num_workers, backend="thread", mp_context=None):
+    """
+    Context manager providing an executor for parallel work.
+    
+    Parameters
+    ----------
+    num_workers: number of workers; None or 1 means that work is done serially
+    backend: "thread" or "process"
+    mp_context: optional multiprocessing context for the "process" backend,
+      e.g. `multiprocessing.get_context("spawn")` for work that is not safe
+      to run in forked processes
+    
+    Returns
+    -------
+    A concurrent.futures executor, or None if work should be done serially
+    """
+    if num_workers is None or num_workers <= 1:
+        yield None
+        return
+    
+    if backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+    elif backend == "process":
+        executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context)
+    else:
+        raise ValueError('unsupported backend: must be "thread" or "process"')
+    
+    with executor:
+        yield executor
+
+
+def imap_ordered(fn, iterable, executor=None, max_pending=1):
+    """
+    Apply `fn` to each item of `iterable`, yielding results in input order.
+    
+    Items are drawn from `iterable` lazily, with at most `max_pending` tasks
+    submitted to the executor at a time. Results therefore do not depend on
+    the order in which the workers complete their tasks. Tasks that have not
+    started are cancelled if the consumer stops iterating early.
+    
+    Parameters
+    ----------
+    fn: function of one argument
+    iterable: iterable of arguments to `fn`
+    executor: concurrent.futures executor, or None to run serially
+    max_pending: maximum number of tasks submitted but not yet yielded
+    """
+    if executor is None:
+        yield from map(fn, iterable)
+        return
+    
+    pending = collections.deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
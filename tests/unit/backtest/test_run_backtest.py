@@ -0,0 +1,88 @@
+import datetime
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from idmodels.backtest import run_backtest
+
+
+class FakeModel():
+    def __init__(self):
+        self.model_config = SimpleNamespace(model_name="fake")
+        self.loads = []
+        self.predictions = []
+    
+    def load_data(self, run_config, as_of):
+        self.loads.append(as_of)
+        return as_of
+    
+    def prepare_data(self, run_config, df):
+        return {"as_of": df}
+    
+    def predict(self, run_config, data, last_obs_date=None):
+        self.predictions.append((run_config.ref_date, data["as_of"], last_obs_date))
+        return pd.DataFrame({"reference_date": [str(run_config.ref_date)], "value": [1.0]})
+
+
+def _run_config(tmp_path):
+    return SimpleNamespace(ref_date=None, output_root=tmp_path / "model-output")
+
+
+@pytest.mark.parametrize("num_workers", [1, 3])
+def test_run_backtest_shares_vintages(tmp_path, num_workers):
+    model = FakeModel()
+    ref_dates = [datetime.date(2024, 1, 20), datetime.date(2024, 1, 6), datetime.date(2024, 1, 13)]
+    as_of_dates = [datetime.date(2024, 1, 6), datetime.date(2024, 1, 15)]
+    
+    preds_df = run_backtest(model, _run_config(tmp_path), ref_dates, as_of_dates=as_of_dates,
+                            num_workers=num_workers)
+    
+    assert model.loads == as_of_dates
+    assert model.predictions == [
+        (datetime.date(2024, 1, 6), datetime.date(2024, 1, 6), datetime.date(2023, 12, 30)),
+        (datetime.date(2024, 1, 13), datetime.date(2024, 1, 6), datetime.date(2024, 1, 6)),
+        (datetime.date(2024, 1, 20), datetime.date(2024, 1, 15), datetime.date(2024, 1, 13))
+    ]
+    assert preds_df["reference_date"].tolist() == ["2024-01-06", "2024-01-13", "2024-01-20"]
+    for ref_date in preds_df["reference_date"]:
+        assert (tmp_path / "model-output" / "UMass-fake" / f"{ref_date}-UMass-fake.csv").exists()
+
+
+def test_run_backtest_latest_vintage(tmp_path):
+    model = FakeModel()
+    run_backtest(model, _run_config(tmp_path), [datetime.date(2024, 1, 6), datetime.date(2024, 1, 13)])
+    
+    assert model.loads == [None]
+    assert len(model.predictions) == 2
+
+
+def test_run_backtest_no_vintage(tmp_path):
+    with pytest.raises(ValueError):
+        run_backtest(FakeModel(), _run_config(tmp_path), [datetime.date(2024, 1, 6)],
+                     as_of_dates=[datetime.date(2024, 1, 13)])
+
+
+@pytest.mark.parametrize("warm_start", [{"booster_store": "warm_start"}, {"mcmc_warm_start": True}])
+def test_run_backtest_warm_start_in_order(tmp_path, warm_start):
+    model = FakeModel()
+    for name, value in warm_start.items():
+        setattr(model.model_config, name, value)
+    active = []
+    max_active = []
+    
+    predict = model.predict
+    def serial_predict(run_config, data, last_obs_date=None):
+        active.append(run_config.ref_date)
+        max_active.append(len(active))
+        time.sleep(0.01)
+        active.remove(run_config.ref_date)
+        return predict(run_config, data, last_obs_date)
+    model.predict = serial_predict
+    
+    ref_dates = [datetime.date(2024, 1, 20), datetime.date(2024, 1, 6), datetime.date(2024, 1, 13)]
+    run_backtest(model, _run_config(tmp_path), ref_dates, num_workers=3)
+    
+    assert max(max_active) == 1
+    assert [p[0] for p in model.predictions] == sorted(ref_dates)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from idmodels.batching import SeriesBatch
+
+
+def _df(location, dates, values):
+    return pd.DataFrame({
+        "location": location,
+        "wk_end_date": pd.to_datetime(dates),
+        "x": values,
+        "y": np.asarray(values) * 10
+    })
+
+
+def test_ragged_series():
+    df = pd.concat([
+        # rows out of date order, with a gap at 2024-01-13
+        _df("US", ["2024-01-20", "2024-01-06", "2024-01-27"], [3.0, 1.0, 4.0]),
+        # starts late and ends early
+        _df("01", ["2024-01-13", "2024-01-20"], [5.0, 6.0])
+    ])
+
+    batch = SeriesBatch(df, ["x", "y"])
+
+    assert batch.locations == ["US", "01"]
+    assert batch.dates.tolist() == pd.to_datetime(["2024-01-06", "2024-01-13", "2024-01-20", "2024-01-27"]).tolist()
+    np.testing.assert_array_equal(batch.values[:, :, 0], [[1.0, 2.0, 3.0, 4.0], [5.0, 5.0, 6.0, 6.0]])
+    np.testing.assert_array_equal(batch.values[:, :, 1], 10 * batch.values[:, :, 0])
+    np.testing.assert_array_equal(batch.mask, [[True, False, True, True], [False, True, True, False]])
+
+
+def test_add_locations():
+    batch = SeriesBatch(_df("US", ["2024-01-06", "2024-01-13"], [1.0, 2.0]), ["x", "y"])
+    values = batch.values.copy()
+
+    batch.add_locations(_df("01", ["2024-01-13"], [7.0]))
+
+    assert batch.locations == ["US", "01"]
+    np.testing.assert_array_equal(batch.values[0], values[0])
+    np.testing.assert_array_equal(batch.values[1, :, 0], [7.0, 7.0])
+    np.testing.assert_array_equal(batch.mask[1], [False, True])
+
+    with pytest.raises(ValueError):
+        batch.add_locations(_df("01", ["2024-01-06"], [1.0]))
+    with pytest.raises(ValueError):
+        batch.add_locations(_df("02", ["2024-01-20"], [1.0]))
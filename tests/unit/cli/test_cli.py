@@ -0,0 +1,105 @@
+import datetime
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from idmodels import cli
+
+
+class FakeModel():
+    loads = []
+    preparations = []
+
+    def __init__(self, model_config):
+        self.model_config = model_config
+
+    def load_data(self, run_config, as_of):
+        FakeModel.loads.append((as_of, tuple(self.model_config.sources)))
+        return as_of
+
+    def prepare_data(self, run_config, df):
+        FakeModel.preparations.append((df, self.model_config.incl_level_feats))
+        return df
+
+    def predict(self, run_config, data):
+        return pd.DataFrame({"reference_date": [str(run_config.ref_date)], "value": [1.0]})
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    FakeModel.loads = []
+    FakeModel.preparations = []
+    monkeypatch.setattr(cli, "_model", FakeModel)
+
+
+def _model_config(name, sources=("nhsn",), incl_level_feats=True):
+    return {"model_class": "gbqr", "model_name": name, "sources": list(sources), "power_transform": "4rt",
+            "reporting_adj": False, "incl_level_feats": incl_level_feats}
+
+
+def _write_config(tmp_path, config):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(config))
+    return path
+
+
+def test_load_configs(tmp_path):
+    path = _write_config(tmp_path, {
+        "run_config": {"disease": "flu", "ref_date": "2024-01-06", "output_root": "out", "locations": None},
+        "model_configs": [_model_config("a")]
+    })
+
+    run_configs, model_configs = cli.load_configs(path)
+
+    assert run_configs[0].ref_date == datetime.date(2024, 1, 6)
+    assert run_configs[0].output_root == Path("out")
+    assert run_configs[0].locations is None
+    assert model_configs[0].model_name == "a"
+
+    run_configs, _ = cli.load_configs(path, ref_date=datetime.date(2024, 1, 13))
+    assert run_configs[0].ref_date == datetime.date(2024, 1, 13)
+
+
+def test_load_configs_invalid(tmp_path):
+    path = _write_config(tmp_path, {
+        "run_config": {"disease": "flu", "ref_date": "2024-01-05"},
+        "model_configs": [_model_config("a")]
+    })
+    with pytest.raises(ValueError):
+        cli.load_configs(path)
+
+    path = _write_config(tmp_path, {
+        "run_config": {"disease": "flu", "ref_date": "2024-01-06"},
+        "model_configs": [{**_model_config("a"), "model_class": "unknown"}]
+    })
+    with pytest.raises(ValueError):
+        cli.load_configs(path)
+
+
+@pytest.mark.parametrize("num_workers", [1, 3])
+def test_main_shares_data(tmp_path, fake_model, num_workers):
+    path = _write_config(tmp_path, {
+        "run_configs": [
+            {"disease": "flu", "ref_date": "2024-01-06", "output_root": str(tmp_path / "out")},
+            {"disease": "flu", "ref_date": "2024-01-13", "output_root": str(tmp_path / "out")}
+        ],
+        "model_configs": [
+            _model_config("a"),
+            _model_config("b", sources=["nhsn", "ilinet"]),
+            _model_config("c"),
+            _model_config("d", incl_level_feats=False)
+        ]
+    })
+
+    assert cli.main([str(path), "--num-workers", str(num_workers)]) == 0
+
+    # one load per reference date and set of sources; one preparation per
+    # loaded data set and set of features
+    assert sorted(FakeModel.loads) == sorted(
+        (datetime.date(2024, 1, d), sources) for d in (6, 13) for sources in [("nhsn",), ("nhsn", "ilinet")])
+    assert len(FakeModel.preparations) == 6
+    for ref_date in ["2024-01-06", "2024-01-13"]:
+        for name in "abcd":
+            assert (tmp_path / "out" / f"UMass-{name}" / f"{ref_date}-UMass-{name}.csv").exists()
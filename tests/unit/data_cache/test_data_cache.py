@@ -0,0 +1,83 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from idmodels.data_cache import DataCache
+
+pytest.importorskip("pyarrow")
+
+
+class CountingLoader():
+    def __init__(self):
+        self.calls = 0
+    
+    def load_data(self, nhsn_kwargs, sources):
+        self.calls += 1
+        return pd.DataFrame({
+            "location": ["US", "01"],
+            "wk_end_date": pd.to_datetime([nhsn_kwargs["as_of"]] * 2),
+            "source": sources[0],
+            "inc_trans_cs": [0.5, -0.25]
+        })
+
+
+def _kwargs(as_of="2024-01-06", sources=["nhsn"]):
+    return {"nhsn_kwargs": {"as_of": datetime.date.fromisoformat(as_of), "disease": "flu"},
+            "sources": sources}
+
+
+def test_data_cache_hit_and_invalidate(tmp_path):
+    loader = CountingLoader()
+    cache = DataCache(tmp_path)
+    
+    df1 = cache.load_data(loader, **_kwargs())
+    df2 = cache.load_data(loader, **_kwargs())
+    assert loader.calls == 1
+    assert_frame_equal(df1, df2)
+    
+    cache.load_data(loader, **_kwargs(sources=["ilinet"]))
+    assert loader.calls == 2
+    
+    assert cache.invalidate(**_kwargs())
+    assert not cache.invalidate(**_kwargs())
+    cache.load_data(loader, **_kwargs())
+    assert loader.calls == 3
+    
+    cache.clear()
+    assert not list(tmp_path.glob("*.parquet"))
+
+
+def test_data_cache_no_as_of_not_cached(tmp_path):
+    loader = CountingLoader()
+    cache = DataCache(tmp_path)
+    kwargs = {"nhsn_kwargs": {"as_of": None}, "sources": ["nhsn"]}
+    
+    cache.load_data(loader, **kwargs)
+    cache.load_data(loader, **kwargs)
+    assert loader.calls == 2
+    assert not list(tmp_path.glob("*.parquet"))
+
+
+def test_data_cache_lru_eviction(tmp_path):
+    loader = CountingLoader()
+    cache = DataCache(tmp_path)
+    cache.load_data(loader, **_kwargs("2024-01-06"))
+    entry_bytes = next(tmp_path.glob("*.parquet")).stat().st_size
+    
+    cache = DataCache(tmp_path, max_bytes=int(2.5 * entry_bytes))
+    cache.load_data(loader, **_kwargs("2024-01-13"))
+    # make sure the access to the first entry is the most recent
+    for i, path in enumerate(sorted(tmp_path.glob("*.parquet"), key=os.path.getmtime)):
+        os.utime(path, (i, i))
+    cache.load_data(loader, **_kwargs("2024-01-06"))
+    cache.load_data(loader, **_kwargs("2024-01-20"))
+    
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+    calls = loader.calls
+    cache.load_data(loader, **_kwargs("2024-01-06"))
+    assert loader.calls == calls
+    cache.load_data(loader, **_kwargs("2024-01-13"))
+    assert loader.calls == calls + 1
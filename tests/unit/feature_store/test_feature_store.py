@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from idmodels.feature_store import FeatureStore
+
+pytest.importorskip("pyarrow")
+
+MAX_HORIZON = 2
+
+
+def _featurize(df):
+    # trailing window of 3 rows and a lag of 1, so features look back 3 rows
+    g = df.groupby(["source", "location"], sort=False)["inc_trans_cs"]
+    df = df.assign(rollmean_w3=g.transform(lambda x: x.rolling(3).mean()))
+    df["rollmean_w3_lag1"] = df.groupby(["source", "location"], sort=False)["rollmean_w3"].shift(1)
+    df = pd.concat([
+        df.assign(horizon=h, inc_trans_cs_target=g.shift(-h)) for h in range(1, MAX_HORIZON + 1)
+    ], axis=0)
+    return df, ["rollmean_w3", "rollmean_w3_lag1", "horizon"]
+
+
+def _data(n_weeks, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame([
+        (source, location, date)
+        for source in ["nhsn", "ilinet"]
+        for location in ["US", "01"]
+        for date in pd.date_range("2023-10-07", periods=n_weeks, freq="7D")
+    ], columns=["source", "location", "wk_end_date"])
+    df["inc_trans_cs"] = rng.normal(size=df.shape[0])
+    df["other"] = "a"
+    return df
+
+
+def _expected(df):
+    expected, _ = _featurize(df.assign(_row=np.arange(df.shape[0])))
+    return expected.sort_values(["horizon", "_row"], kind="stable").drop(columns="_row").reset_index(drop=True)
+
+
+def _store_featurize(store, df):
+    return store.featurize(df, _featurize, key={"max_horizon": MAX_HORIZON}, value_cols=["inc_trans_cs"],
+                           lookback=3, lookahead=MAX_HORIZON)
+
+
+def test_feature_store_incremental_matches_full(tmp_path):
+    store = FeatureStore(tmp_path)
+    calls = []
+    
+    def featurize_counting(df):
+        calls.append(df.shape[0])
+        return _featurize(df)
+    
+    # initial run computes everything
+    df = _data(20).query("wk_end_date < '2024-02-10'")
+    actual, feat_names = store.featurize(df, featurize_counting, key={}, value_cols=["inc_trans_cs"],
+                                         lookback=3, lookahead=MAX_HORIZON)
+    assert calls == [df.shape[0]]
+    assert feat_names == ["rollmean_w3", "rollmean_w3_lag1", "horizon"]
+    assert_frame_equal(actual, _expected(df))
+    
+    # a new week of data, and a revision to earlier data for one location
+    df = _data(20)
+    df.loc[(df["location"] == "01") & (df["wk_end_date"] == "2024-01-20"), "inc_trans_cs"] += 1.0
+    actual, _ = store.featurize(df, featurize_counting, key={}, value_cols=["inc_trans_cs"],
+                                lookback=3, lookahead=MAX_HORIZON)
+    assert calls[1] < df.shape[0]
+    assert_frame_equal(actual, _expected(df))
+    
+    # no changes: nothing is recomputed
+    actual, _ = store.featurize(df, featurize_counting, key={}, value_cols=["inc_trans_cs"],
+                                lookback=3, lookahead=MAX_HORIZON)
+    assert len(calls) == 2
+    assert_frame_equal(actual, _expected(df))
+
+
+def test_feature_store_keeps_other_groups(tmp_path):
+    store = FeatureStore(tmp_path)
+    df = _data(10)
+    _store_featurize(store, df)
+    
+    # featurize a single location, then all locations again
+    _store_featurize(store, df.query("location == 'US'"))
+    actual, _ = _store_featurize(store, df)
+    
+    assert_frame_equal(actual, _expected(df))
+
+
+def _standardize(df):
+    # like iddata, standardize with factors computed from the whole series of
+    # each source and location, so that new data change every standardized value
+    g = df.groupby(["source", "location"], sort=False)["inc_trans"]
+    df = df.assign(inc_trans_scale_factor=g.transform("max"))
+    df["inc_trans_cs"] = df["inc_trans"] / (df["inc_trans_scale_factor"] + 0.01)
+    df["inc_trans_center_factor"] = df.groupby(["source", "location"], sort=False)["inc_trans_cs"].transform("mean")
+    df["inc_trans_cs"] = df["inc_trans_cs"] - df["inc_trans_center_factor"]
+    return df
+
+
+def _featurize_with_slope(df):
+    df, feat_names = _featurize(df)
+    df["diff_w1"] = df["inc_trans_cs"] - df.groupby(["source", "location", "horizon"], sort=False)["inc_trans_cs"].shift(1)
+    return df, feat_names + ["diff_w1"]
+
+
+def test_feature_store_restandardizes(tmp_path):
+    store = FeatureStore(tmp_path)
+    kinds = {"rollmean_w3": "affine", "rollmean_w3_lag1": "affine", "inc_trans_cs_target": "affine",
+             "diff_w1": "scale"}
+    standardization = {"scale": "inc_trans_scale_factor", "scale_offset": 0.01, "center": "inc_trans_center_factor",
+                       "kind": kinds.get}
+    calls = []
+    
+    def featurize_counting(df):
+        calls.append(df.shape[0])
+        return _featurize_with_slope(df)
+    
+    def expected(df):
+        expected, _ = _featurize_with_slope(df.assign(_row=np.arange(df.shape[0])))
+        return expected.sort_values(["horizon", "_row"], kind="stable").drop(columns="_row").reset_index(drop=True)
+    
+    data = _data(20).rename(columns={"inc_trans_cs": "inc_trans"})
+    data["inc_trans"] = np.exp(data["inc_trans"])
+    df = _standardize(data.query("wk_end_date < '2024-02-10'"))
+    store.featurize(df, featurize_counting, key={}, value_cols=["inc_trans"], lookback=3,
+                    lookahead=MAX_HORIZON, standardization=standardization)
+    
+    # a new week with a new maximum changes the factors and all of inc_trans_cs
+    data.loc[data["wk_end_date"] == "2024-02-10", "inc_trans"] = 100.0
+    new_df = _standardize(data)
+    old_rows = new_df["wk_end_date"] < "2024-02-10"
+    assert (new_df.loc[old_rows, "inc_trans_cs"].to_numpy() != df["inc_trans_cs"].to_numpy()).all()
+    
+    actual, _ = store.featurize(new_df, featurize_counting, key={}, value_cols=["inc_trans"], lookback=3,
+                                lookahead=MAX_HORIZON, standardization=standardization)
+    assert calls[1] < new_df.shape[0]
+    assert_frame_equal(actual, expected(new_df), check_exact=False)
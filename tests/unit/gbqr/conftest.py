@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def train_test_data():
+    """
+    Factory of small training and test sets for `_get_test_quantile_predictions`,
+    with features "x1" and "x2" and 40 training rows per season.
+    
+    The factory takes the number of seasons, default 6, and returns a tuple
+    with the training data frame, the training features, the training
+    targets, and the test features.
+    """
+    def make(n_seasons=6):
+        rng = np.random.default_rng(42)
+        n_per_season = 40
+        df_train = pd.DataFrame({
+            "season": np.repeat([f"{2015 + s}/{16 + s}" for s in range(n_seasons)], n_per_season),
+            "location": "US",
+            "x1": rng.normal(size=n_seasons * n_per_season),
+            "x2": rng.normal(size=n_seasons * n_per_season)
+        })
+        df_train["delta_target"] = df_train["x1"] - 0.5 * df_train["x2"] + \
+            rng.normal(scale=0.1, size=len(df_train))
+        x_test = rng.normal(size=(5, 2)).astype(np.float32)
+        
+        return df_train, df_train[["x1", "x2"]].to_numpy(np.float32), df_train["delta_target"].to_numpy(), x_test
+    
+    return make
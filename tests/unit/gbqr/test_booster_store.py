@@ -0,0 +1,86 @@
+import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import lightgbm as lgb
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from idmodels.gbqr import GBQRModel
+
+
+def _predict(tmp_path, data, **model_settings):
+    df_train, x_train, y_train, x_test = data
+    model_config = SimpleNamespace(model_name="gbqr_test", num_bags=2, bag_frac_samples=0.7,
+                                   fit_locations_separately=False, **model_settings)
+    run_config = SimpleNamespace(ref_date=datetime.date.fromisoformat("2024-01-06"), disease="flu",
+                                 locations=None, max_horizon=3,
+                                 q_levels=[0.1, 0.5, 0.9], q_labels=["0.1", "0.5", "0.9"],
+                                 artifact_store_root=tmp_path, save_feat_importance=False)
+    return GBQRModel(model_config)._get_test_quantile_predictions(
+        run_config, df_train, x_train, y_train, x_test, ["x1", "x2"])
+
+
+def _stored_boosters(tmp_path, pattern="b*-q*[0-9].txt"):
+    return sorted((tmp_path / "UMass-gbqr_test" / "boosters").glob(f"*/{pattern}"))
+
+
+def _num_trees(paths):
+    return [lgb.Booster(model_file=path).num_trees() for path in paths]
+
+
+@pytest.mark.parametrize("shared_dataset", [False, True])
+def test_reuse_stored_boosters(tmp_path, train_test_data, shared_dataset):
+    data = train_test_data()
+    expected = _predict(tmp_path, data, booster_store="save", shared_dataset=shared_dataset)
+    assert len(_stored_boosters(tmp_path)) == 6
+    
+    # boosters trained on the same inputs are used without refitting
+    with patch.object(lgb.LGBMRegressor, "fit", side_effect=AssertionError), \
+            patch.object(lgb, "train", side_effect=AssertionError):
+        actual = _predict(tmp_path, data, booster_store="reuse", shared_dataset=shared_dataset)
+    
+    assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize("shared_dataset", [False, True])
+def test_warm_start_stored_boosters(tmp_path, train_test_data, shared_dataset):
+    _predict(tmp_path, train_test_data(n_seasons=5), booster_store="save", shared_dataset=shared_dataset)
+    num_trees = _num_trees(_stored_boosters(tmp_path))
+    
+    # new training data, week after week: boosters are trained for further
+    # rounds from the unchanged base boosters
+    for n_seasons in [6, 7]:
+        expected = _predict(tmp_path, train_test_data(n_seasons=n_seasons), booster_store="warm_start",
+                            warm_start_rounds=5, shared_dataset=shared_dataset)
+        
+        assert _num_trees(_stored_boosters(tmp_path)) == num_trees
+        assert _num_trees(_stored_boosters(tmp_path, "*-warm.txt")) == [n + 5 for n in num_trees]
+    
+    # warm started boosters trained on the same inputs are used without refitting
+    with patch.object(lgb.LGBMRegressor, "fit", side_effect=AssertionError), \
+            patch.object(lgb, "train", side_effect=AssertionError):
+        actual = _predict(tmp_path, train_test_data(n_seasons=7), booster_store="warm_start",
+                          warm_start_rounds=5, shared_dataset=shared_dataset)
+    
+    assert_frame_equal(actual, expected)
+
+
+def test_booster_store_keyed_by_categories(tmp_path, train_test_data):
+    df_train = train_test_data()[0]
+    model_config = SimpleNamespace(model_name="gbqr_test", num_bags=2, bag_frac_samples=0.7,
+                                   fit_locations_separately=False, booster_store="warm_start")
+    run_config = SimpleNamespace(disease="flu", locations=None, max_horizon=3, artifact_store_root=tmp_path)
+    model = GBQRModel(model_config)
+    
+    # a new location shifts the codes of the existing ones
+    store_dirs = [
+        model._booster_store(run_config, df_train.assign(location_cat=pd.Categorical(df_train["location"],
+                                                                                     categories=categories)))
+        .store_dir
+        for categories in [["US"], ["01", "US"], ["US"]]
+    ]
+    
+    assert store_dirs[0] != store_dirs[1]
+    assert store_dirs[0] == store_dirs[2]
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from idmodels.gbqr import _feature_matrix
+
+
+def test_feature_matrix():
+    df = pd.DataFrame({
+        "inc_trans_cs": [0.5, np.nan, -1.25],
+        "location_US": [True, False, False],
+        "location_cat": pd.Categorical(["US", "01", None], categories=["01", "US"]),
+        "unused": ["a", "b", "c"]
+    })
+    
+    actual = _feature_matrix(df, ["location_cat", "inc_trans_cs", "location_US"])
+    
+    expected = np.array([[1.0, 0.5, 1.0],
+                         [0.0, np.nan, 0.0],
+                         [np.nan, -1.25, 0.0]], dtype=np.float32)
+    assert actual.dtype == np.float32
+    assert actual.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,143 @@
+import datetime
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from idmodels.gbqr import GBQRModel, _feature_matrix
+from idmodels.profiling import StageProfiler
+
+
+def _configs(**model_settings):
+    model_config = SimpleNamespace(model_name="gbqr_test", num_bags=4, bag_frac_samples=0.7,
+                                   **model_settings)
+    run_config = SimpleNamespace(ref_date=datetime.date.fromisoformat("2024-01-06"),
+                                 q_levels=[0.1, 0.5, 0.9], q_labels=["0.1", "0.5", "0.9"],
+                                 save_feat_importance=False)
+    return model_config, run_config
+
+
+@pytest.mark.parametrize("shared_dataset", [False, True])
+def test_parallel_bags_match_serial(train_test_data, shared_dataset):
+    df_train, x_train, y_train, x_test = train_test_data()
+    
+    results = []
+    for num_workers in [1, 3]:
+        model_config, run_config = _configs(num_workers=num_workers, lgb_num_threads=1,
+                                            shared_dataset=shared_dataset)
+        results.append(
+            GBQRModel(model_config)._get_test_quantile_predictions(
+                run_config, df_train, x_train, y_train, x_test, ["x1", "x2"])
+        )
+    
+    assert_frame_equal(results[0], results[1], check_exact=True)
+
+
+@pytest.mark.parametrize("settings, expected", [
+    ({}, None),
+    ({"num_workers": 3}, 2),
+    ({"num_workers": 8}, 1),
+    ({"num_workers": 3, "lgb_num_threads": 4}, 4)
+])
+def test_lgb_num_threads(monkeypatch, settings, expected):
+    monkeypatch.setattr(os, "cpu_count", lambda: 6)
+    model_config, _ = _configs(**settings)
+    
+    assert GBQRModel(model_config)._lgb_num_threads() == expected
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+@pytest.mark.parametrize("shared_dataset", [False, True])
+def test_categorical_feats(train_test_data, shared_dataset):
+    df_train, _, _, _ = train_test_data()
+    df_train["cat"] = pd.Categorical(np.tile(["a", "b", "c"], 80))
+    df_train["delta_target"] = df_train["delta_target"] + 5.0 * (df_train["cat"] == "b")
+    feat_names = ["x1", "x2", "cat"]
+    x_train = _feature_matrix(df_train, feat_names)
+    x_test = _feature_matrix(pd.DataFrame({"x1": 0.0, "x2": 0.0,
+                                           "cat": pd.Categorical(["a", "b", "c"], categories=["a", "b", "c"])}),
+                             feat_names)
+    model_config, run_config = _configs(shared_dataset=shared_dataset)
+    
+    preds = GBQRModel(model_config)._get_test_quantile_predictions(
+        run_config, df_train, x_train, df_train["delta_target"].to_numpy(), x_test, feat_names)
+    
+    # the categorical feature is used: predictions are shifted for category "b"
+    assert (preds.loc[1] - preds.loc[0] > 3.0).all()
+    assert (preds.loc[1] - preds.loc[2] > 3.0).all()
+
+
+def test_anchor_q_levels_match_full_fit(train_test_data):
+    df_train, x_train, y_train, x_test = train_test_data()
+    
+    model_config, run_config = _configs()
+    full = GBQRModel(model_config)._get_test_quantile_predictions(
+        run_config, df_train, x_train, y_train, x_test, ["x1", "x2"])
+    
+    model_config, run_config = _configs(anchor_q_levels=[0.1, 0.9])
+    anchored = GBQRModel(model_config)._get_test_quantile_predictions(
+        run_config, df_train, x_train, y_train, x_test, ["x1", "x2"])
+    
+    assert list(anchored.columns) == run_config.q_labels
+    assert_frame_equal(anchored[["0.1", "0.9"]], full[["0.1", "0.9"]], check_exact=True)
+    assert (anchored["0.1"] <= anchored["0.5"]).all() and (anchored["0.5"] <= anchored["0.9"]).all()
+
+
+@pytest.mark.parametrize("bag_tol,expected_num_bags", [(np.inf, 3), (0.0, 8)])
+def test_adaptive_num_bags(train_test_data, bag_tol, expected_num_bags):
+    df_train, x_train, y_train, x_test = train_test_data()
+    
+    results = []
+    for num_workers in [1, 3]:
+        model_config, run_config = _configs(num_workers=num_workers, lgb_num_threads=1,
+                                            bag_tol=bag_tol, min_bags=3, bag_patience=2)
+        model_config.num_bags = 8
+        results.append(
+            GBQRModel(model_config)._get_test_quantile_predictions(
+                run_config, df_train, x_train, y_train, x_test, ["x1", "x2"])
+        )
+    
+    assert results[0].attrs["num_bags_used"] == expected_num_bags
+    assert_frame_equal(results[0], results[1], check_exact=True)
+
+
+def test_profile_bag_fits(train_test_data):
+    df_train, x_train, y_train, x_test = train_test_data()
+    model_config, run_config = _configs(num_workers=2)
+    
+    profiler = StageProfiler()
+    GBQRModel(model_config)._get_test_quantile_predictions(
+        run_config, df_train, x_train, y_train, x_test, ["x1", "x2"], profiler=profiler)
+    
+    records = profiler.to_frame()
+    fits = records.loc[records["stage"] == "fit"]
+    assert sorted(zip(fits["b"], fits["q_level"])) == \
+        [(b, q_level) for b in range(4) for q_level in run_config.q_levels]
+    assert (records["stage"] == "predict").sum() == 12
+
+
+@pytest.mark.parametrize("importance_type", ["split", "gain"])
+def test_save_feat_importance(tmp_path, train_test_data, importance_type):
+    df_train, x_train, y_train, x_test = train_test_data()
+    model_config, run_config = _configs()
+    run_config.save_feat_importance = True
+    run_config.feat_importance_type = importance_type
+    run_config.feat_importance_summary = [0.5]
+    run_config.artifact_store_root = tmp_path
+    
+    GBQRModel(model_config)._get_test_quantile_predictions(
+        run_config, df_train, x_train, y_train, x_test, ["x1", "x2"])
+    
+    model_dir = tmp_path / "UMass-gbqr_test"
+    feat_importance = pd.read_csv(model_dir / "feat_importance" / "2024-01-06-UMass-gbqr_test.csv")
+    assert list(zip(feat_importance["b"], feat_importance["q_level"], feat_importance["feat"])) == \
+        [(b, q_level, feat) for b in range(4) for q_level in [0.1, 0.5, 0.9] for feat in ["x1", "x2"]]
+    assert (feat_importance["importance"] > 0).all()
+    
+    summary = pd.read_csv(model_dir / "feat_importance_summary" / "2024-01-06-UMass-gbqr_test.csv")
+    expected = feat_importance.groupby(["q_level", "feat"], sort=False)["importance"].agg(["mean", "median"])
+    np.testing.assert_allclose(summary["mean"], expected["mean"])
+    np.testing.assert_allclose(summary["q0.5"], expected["median"])
@@ -0,0 +1,103 @@
+import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from idmodels.gbqr import GBQRModel
+from idmodels.profiling import StageProfiler
+
+MAX_HORIZON = 3
+
+
+def _prepared_data(n_weeks=20):
+    # prepared data with one row per location, week and horizon; the feature
+    # "week" identifies the week of each row
+    rng = np.random.default_rng(42)
+    wk_end_date = pd.date_range("2023-10-07", periods=n_weeks, freq="7D")
+    df = pd.DataFrame([
+        (location, date, week, h)
+        for h in range(1, MAX_HORIZON + 1)
+        for location in ["US", "01"]
+        for week, date in enumerate(wk_end_date)
+    ], columns=["location", "wk_end_date", "week", "horizon"])
+    df = df.assign(source="nhsn", season=np.where(df["week"] < n_weeks // 2, "2022/23", "2023/24"),
+                   inc_trans_cs=0.1, inc_trans_center_factor=0.5, inc_trans_scale_factor=2.0, pop=1e6)
+    df["delta_target"] = np.where(df["week"] + df["horizon"] < n_weeks,
+                                  0.01 * df["week"] + rng.normal(scale=0.1, size=df.shape[0]), np.nan)
+    
+    return df, ["week"]
+
+
+@pytest.mark.parametrize("fit_locations_separately", [False, True])
+def test_predict_masks_after_last_obs_date(monkeypatch, fit_locations_separately):
+    fits = []
+    
+    def fake_get_test_quantile_predictions(self, run_config, df_train, x_train, y_train, x_test, feat_names,
+                                           profiler=None):
+        fits.append((df_train, x_test))
+        preds = pd.DataFrame(np.zeros((x_test.shape[0], len(run_config.q_labels))), columns=run_config.q_labels)
+        preds.attrs["num_bags_used"] = 1
+        return preds
+    
+    monkeypatch.setattr(GBQRModel, "_get_test_quantile_predictions", fake_get_test_quantile_predictions)
+    model_config = SimpleNamespace(model_name="gbqr_test", power_transform="4rt",
+                                   fit_locations_separately=fit_locations_separately)
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2024, 1, 6),
+                                 q_levels=[0.1, 0.5, 0.9], q_labels=["0.1", "0.5", "0.9"])
+    data = _prepared_data()
+    last_obs_date = pd.Timestamp("2023-12-30")
+    
+    preds_df = GBQRModel(model_config).predict(run_config, data, last_obs_date=last_obs_date)
+    
+    # the test set is the week of the last observation
+    cutoff_week = 12
+    assert len(fits) == (2 if fit_locations_separately else 1)
+    for df_train, x_test in fits:
+        np.testing.assert_array_equal(x_test[:, 0], cutoff_week)
+        assert x_test.shape[0] == MAX_HORIZON * (1 if fit_locations_separately else 2)
+        
+        # no training target falls after the last observation, although the
+        # data include targets up to the end of the series
+        target_date = df_train["wk_end_date"] + pd.to_timedelta(7 * df_train["horizon"], unit="D")
+        assert (target_date <= last_obs_date).all()
+        assert df_train["week"].max() == cutoff_week - 1
+    
+    assert (preds_df["target_end_date"] - pd.to_timedelta(7 * preds_df["horizon"], unit="D") ==
+            pd.Timestamp(run_config.ref_date)).all()
+    assert sorted(preds_df["horizon"].unique()) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("location_backend", ["thread", "process"])
+def test_parallel_locations_match_serial(location_backend):
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2024, 2, 24),
+                                 q_levels=[0.1, 0.5, 0.9], q_labels=["0.1", "0.5", "0.9"],
+                                 save_feat_importance=False)
+    data = _prepared_data()
+    
+    results = []
+    for location_workers in [1, 2]:
+        model_config = SimpleNamespace(model_name="gbqr_test", power_transform="4rt", num_bags=2,
+                                       bag_frac_samples=0.7, fit_locations_separately=True,
+                                       location_workers=location_workers, location_backend=location_backend)
+        results.append(GBQRModel(model_config).predict(run_config, data))
+    
+    assert results[0]["location"].unique().tolist() == ["US", "01"]
+    assert_frame_equal(results[0], results[1], check_exact=True)
+
+
+def test_predict_profiles_each_stage_once():
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2024, 2, 24),
+                                 q_levels=[0.1, 0.5, 0.9], q_labels=["0.1", "0.5", "0.9"],
+                                 save_feat_importance=False)
+    model_config = SimpleNamespace(model_name="gbqr_test", power_transform="4rt", num_bags=2,
+                                   bag_frac_samples=0.7, fit_locations_separately=False)
+    profiler = StageProfiler()
+    
+    GBQRModel(model_config).predict(run_config, _prepared_data(), profiler=profiler)
+    
+    counts = profiler.to_frame()["stage"].value_counts().to_dict()
+    assert counts == {"split": 1, "feature_matrix": 1, "fit": 6, "predict": 6, "combine_bags": 1,
+                      "postprocess": 1, "noncrossing": 1}
@@ -0,0 +1,31 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# dependencies that are only imported when a model is run
+HEAVY_MODULES = ["lightgbm", "sklearn", "iddata", "timeseriesutils", "sarix", "jax", "numpyro", "IPython"]
+
+
+def _run_python(code):
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+@pytest.mark.parametrize("statement", [
+    "import idmodels",
+    "import idmodels.gbqr",
+    "import idmodels.sarix",
+    "import idmodels.backtest",
+    "from idmodels import GBQRModel, SARIXModel, run_backtest"
+])
+def test_no_heavy_imports(statement):
+    imported = _run_python(
+        "import json, sys\n"
+        f"{statement}\n"
+        f"print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({HEAVY_MODULES!r}))))"
+    )
+    
+    assert imported == []
+
@@ -0,0 +1,48 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from idmodels.postprocess import build_hub_quantile_df, get_inv_power, invert_transforms
+
+
+def test_build_hub_quantile_df():
+    ref_date = datetime.date.fromisoformat("2024-01-06")
+    actual = build_hub_quantile_df(
+        location=np.array(["US", "US", "01"]),
+        wk_end_date=np.array(["2023-12-30", "2023-12-30", "2023-12-30"], dtype="datetime64[ns]"),
+        horizon=np.array([1, 3, 2]),
+        output_type_id=np.array(["0.5", "0.5", "0.975"]),
+        value=np.array([1.0, 2.0, 3.0]),
+        ref_date=ref_date,
+        disease="flu")
+    
+    assert list(actual.columns) == ["location", "horizon", "output_type_id", "value",
+                                    "target_end_date", "reference_date", "target", "output_type"]
+    assert list(actual["horizon"]) == [0, 2, 1]
+    assert list(actual["target_end_date"]) == list(pd.to_datetime(["2024-01-06", "2024-01-20", "2024-01-13"]))
+    assert (actual["reference_date"] == ref_date).all()
+    assert (actual["target"] == "wk inc flu hosp").all()
+    assert (actual["output_type"] == "quantile").all()
+
+
+def test_invert_transforms():
+    inc_trans_cs_hat = np.array([[-1.0, 0.5], [0.0, 1.0]])
+    center = np.array([[0.5], [1.0]])
+    scale = np.array([[2.0], [1.0]])
+    pop = np.array([[100000], [200000]])
+    
+    actual = invert_transforms(inc_trans_cs_hat, center, scale, pop, inv_power=2, scale_offset=0.0)
+    
+    expected = np.array([[0.0, 4.0 - 0.01 - 0.75**4],
+                         [2 * (1.0 - 0.01 - 0.75**4), 2 * (4.0 - 0.01 - 0.75**4)]])
+    np.testing.assert_allclose(actual, expected)
+
+
+def test_get_inv_power():
+    assert get_inv_power("4rt") == 4
+    assert get_inv_power(None) == 1
+    assert get_inv_power(None, square_fallback=True) == 2
+    with pytest.raises(ValueError):
+        get_inv_power("sqrt")
@@ -0,0 +1,37 @@
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from idmodels.postprocess import interpolate_quantiles
+
+Q_LEVELS = [0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5,
+            0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.975, 0.99]
+ANCHOR_Q_LEVELS = [0.025, 0.1, 0.25, 0.5, 0.75, 0.9, 0.975]
+
+
+def test_interpolate_quantiles_exact_for_normal():
+    dists = [NormalDist(0.0, 1.0), NormalDist(3.0, 0.5)]
+    anchor_values = np.array([[d.inv_cdf(q) for q in ANCHOR_Q_LEVELS] for d in dists])
+    
+    actual = interpolate_quantiles(ANCHOR_Q_LEVELS, anchor_values, Q_LEVELS)
+    
+    expected = np.array([[d.inv_cdf(q) for q in Q_LEVELS] for d in dists])
+    np.testing.assert_allclose(actual, expected)
+
+
+def test_interpolate_quantiles_monotone():
+    rng = np.random.default_rng(42)
+    anchor_values = rng.normal(size=(50, len(ANCHOR_Q_LEVELS)))
+    
+    actual = interpolate_quantiles(ANCHOR_Q_LEVELS, anchor_values, Q_LEVELS)
+    
+    assert actual.shape == (50, len(Q_LEVELS))
+    assert np.all(np.diff(actual, axis=1) >= 0)
+    anchor_cols = [Q_LEVELS.index(q) for q in ANCHOR_Q_LEVELS]
+    np.testing.assert_allclose(actual[:, anchor_cols], np.sort(anchor_values, axis=1))
+
+
+def test_interpolate_quantiles_requires_two_anchors():
+    with pytest.raises(ValueError):
+        interpolate_quantiles([0.5], np.zeros((1, 1)), Q_LEVELS)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from idmodels.postprocess import quantile_noncrossing
+
+
+def _preds_df():
+    rng = np.random.default_rng(0)
+    q_labels = ["0.025", "0.1", "0.5", "0.9", "0.975"]
+    locations = ["US", "01", "02"]
+    horizons = [1, 2]
+    # rows ordered as produced by melting one column per quantile level
+    return pd.DataFrame({
+        "location": np.tile(np.repeat(locations, len(horizons)), len(q_labels)),
+        "horizon": np.tile(horizons, len(locations) * len(q_labels)),
+        "output_type_id": np.repeat(q_labels, len(locations) * len(horizons)),
+        "value": rng.normal(size=len(locations) * len(horizons) * len(q_labels))
+    })
+
+
+def test_quantile_noncrossing_sort_matches_groupwise_sort():
+    preds_df = _preds_df()
+    gcols = ["location", "horizon"]
+    
+    expected = preds_df.set_index(gcols).groupby(gcols)[["output_type_id", "value"]] \
+        .transform(lambda x: x.sort_values()) \
+        .reset_index()
+    actual = quantile_noncrossing(preds_df, gcols)
+    
+    assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_quantile_noncrossing_isotonic():
+    preds_df = _preds_df()
+    gcols = ["location", "horizon"]
+    
+    actual = quantile_noncrossing(preds_df, gcols, method="isotonic")
+    
+    assert_frame_equal(actual[gcols + ["output_type_id"]],
+                       quantile_noncrossing(preds_df, gcols)[gcols + ["output_type_id"]])
+    for _, group in actual.groupby(gcols):
+        values = group.sort_values("output_type_id")["value"].to_numpy()
+        assert np.all(np.diff(values) >= 0)
+    # isotonic regression preserves the mean within each group
+    np.testing.assert_allclose(actual.groupby(gcols)["value"].mean(),
+                               preds_df.groupby(gcols)["value"].mean())
+
+
+def test_quantile_noncrossing_isotonic_monotone_unchanged():
+    preds_df = pd.DataFrame({
+        "location": "US",
+        "output_type_id": ["0.1", "0.5", "0.9"],
+        "value": [1.0, 2.5, 2.5]
+    })
+    
+    actual = quantile_noncrossing(preds_df, ["location"], method="isotonic")
+    
+    assert_frame_equal(actual, preds_df)
+
+
+def test_quantile_noncrossing_invalid_method():
+    with pytest.raises(ValueError):
+        quantile_noncrossing(_preds_df(), ["location", "horizon"], method="cummax")
@@ -0,0 +1,31 @@
+import json
+
+import pandas as pd
+
+from idmodels.profiling import StageProfiler, stage
+
+
+def test_stage_profiler_records_stages(tmp_path):
+    hook_records = []
+    profiler = StageProfiler(hook=hook_records.append)
+    
+    with stage(profiler, "load"):
+        sum(range(100000))
+    for b in range(2):
+        with stage(profiler, "fit", b=b, q_level=0.5):
+            pass
+    
+    records = profiler.to_frame()
+    assert records["stage"].tolist() == ["load", "fit", "fit"]
+    assert records["b"].tolist()[1:] == [0, 1]
+    assert (records[["wall_time", "cpu_time"]] >= 0).all().all()
+    assert hook_records == profiler.records
+    
+    profiler.save(json_path=tmp_path / "profile.json", csv_path=tmp_path / "profile.csv")
+    assert json.loads((tmp_path / "profile.json").read_text())["stages"][0]["stage"] == "load"
+    assert pd.read_csv(tmp_path / "profile.csv").shape[0] == 3
+
+
+def test_stage_without_profiler():
+    with stage(None, "load"):
+        pass
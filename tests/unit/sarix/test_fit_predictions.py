@@ -0,0 +1,137 @@
+import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import idmodels.sarix
+from idmodels.sarix import SARIXModel
+from idmodels.utils import worker_pool
+
+
+def _fake_fit_sarix(calls, sarix_kwargs, num_devices, cache_dir, xy):
+    calls.append((xy.shape[0], num_devices))
+    # predictions identify the location they belong to by its first value
+    return np.broadcast_to(xy[None, :, :1, :1], (10, xy.shape[0], sarix_kwargs["forecast_horizon"], 1))
+
+
+@pytest.mark.parametrize("theta_pooling, expected_shards", [("none", [3, 2]), ("shared", [5])])
+def test_fit_location_shards(monkeypatch, theta_pooling, expected_shards):
+    calls = []
+    monkeypatch.setattr(idmodels.sarix, "_fit_sarix",
+                        lambda *args: _fake_fit_sarix(calls, *args))
+    # fit shards in threads, so that the fake fit above is used
+    monkeypatch.setattr(idmodels.sarix, "worker_pool",
+                        lambda num_workers, backend, mp_context=None: worker_pool(num_workers, "thread"))
+    model_config = SimpleNamespace(p=2, d=0, P=0, D=0, season_period=1, theta_pooling=theta_pooling,
+                                   sigma_pooling="none", location_workers=2, parallel_chains=True)
+    run_config = SimpleNamespace(max_horizon=3, num_warmup=10, num_samples=10, num_chains=4)
+    batched_xy = np.arange(5, dtype=float)[:, None, None] * np.ones((5, 20, 1))
+
+    predictions, mcmc_metadata = SARIXModel(model_config)._fit_predictions(run_config, batched_xy)
+
+    assert sorted(calls, reverse=True) == [(n, 4) for n in expected_shards]
+    assert predictions.shape == (10, 5, 3, 1)
+    assert mcmc_metadata is None
+    np.testing.assert_array_equal(predictions[0, :, 0, 0], np.arange(5))
+
+
+def test_thread_backend_rejected():
+    model_config = SimpleNamespace(p=2, d=0, P=0, D=0, season_period=1, theta_pooling="none",
+                                   sigma_pooling="none", location_workers=2, location_backend="thread")
+    run_config = SimpleNamespace(max_horizon=3, num_warmup=10, num_samples=10, num_chains=1)
+    with pytest.raises(ValueError):
+        SARIXModel(model_config)._fit_predictions(run_config, np.ones((5, 20, 1)))
+
+
+def _series_df(locations, n_weeks=30):
+    wk_end_date = pd.date_range("2022-10-01", periods=n_weeks, freq="7D")
+    return pd.DataFrame({
+        "location": np.repeat(locations, n_weeks),
+        "wk_end_date": np.tile(wk_end_date, len(locations)),
+        "inc_trans_cs": 0.1,
+        "inc_trans_center_factor": 0.5,
+        "inc_trans_scale_factor": 2.0,
+        "pop": 1e6
+    })
+
+
+def test_time_bucket_and_compilation_cache(monkeypatch, tmp_path):
+    fits = []
+
+    def fake_fit_sarix(sarix_kwargs, num_devices, cache_dir, xy):
+        fits.append((xy.shape, cache_dir))
+        return np.zeros((10, xy.shape[0], sarix_kwargs["forecast_horizon"], 1))
+
+    monkeypatch.setattr(idmodels.sarix, "_fit_sarix", fake_fit_sarix)
+    df = _series_df(["US", "01"])
+    model_config = SimpleNamespace(p=2, d=0, P=0, D=0, season_period=1, theta_pooling="shared",
+                                   sigma_pooling="none", x=[], power_transform="4rt", time_bucket=8,
+                                   compilation_cache=True)
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2024, 1, 6), max_horizon=3,
+                                 num_warmup=10, num_samples=10, num_chains=1, q_levels=[0.5], q_labels=["0.5"],
+                                 artifact_store_root=tmp_path)
+
+    preds_df = SARIXModel(model_config).predict(run_config, df)
+
+    assert fits == [((2, 24, 1), tmp_path / "jax_cache")]
+    assert preds_df.shape[0] == 6
+
+
+def test_hub_layout(monkeypatch):
+    locations = ["US", "01", "02"]
+
+    def fake_fit_sarix(sarix_kwargs, num_devices, cache_dir, xy):
+        # samples increase with location and horizon, and spread out within each
+        base = np.arange(len(locations))[:, None] * 10 + np.arange(1, sarix_kwargs["forecast_horizon"] + 1)
+        return (base[None, :, :] + np.linspace(0, 1, 101)[:, None, None])[..., None]
+
+    monkeypatch.setattr(idmodels.sarix, "_fit_sarix", fake_fit_sarix)
+    model_config = SimpleNamespace(p=2, d=0, P=0, D=0, season_period=1, theta_pooling="shared",
+                                   sigma_pooling="none", x=[], power_transform="4rt")
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2023, 4, 29), max_horizon=2,
+                                 num_warmup=10, num_samples=10, num_chains=1,
+                                 q_levels=[0.1, 0.5, 0.9], q_labels=["0.1", "0.5", "0.9"])
+
+    preds_df = SARIXModel(model_config).predict(run_config, _series_df(locations))
+
+    # rows by horizon, then quantile level, then location; the last
+    # observation is a week before the reference date
+    assert preds_df["horizon"].tolist() == [0] * 9 + [1] * 9
+    assert preds_df["output_type_id"].tolist() == (["0.1"] * 3 + ["0.5"] * 3 + ["0.9"] * 3) * 2
+    assert preds_df["location"].tolist() == locations * 6
+    loc_inds = np.tile(np.arange(3), 6)
+    expected_order = np.argsort(loc_inds * 10 + preds_df["horizon"].to_numpy() +
+                                preds_df["output_type_id"].astype(float).to_numpy())
+    np.testing.assert_array_equal(np.argsort(preds_df["value"].to_numpy()), expected_order)
+
+
+def test_predict_masks_after_last_obs_date(monkeypatch):
+    fits = []
+
+    def fake_fit_sarix(sarix_kwargs, num_devices, cache_dir, xy):
+        fits.append(xy.copy())
+        return np.zeros((10, xy.shape[0], sarix_kwargs["forecast_horizon"], 1))
+
+    monkeypatch.setattr(idmodels.sarix, "_fit_sarix", fake_fit_sarix)
+    # inc_trans_cs identifies the week of each row
+    df = _series_df(["US", "01"])
+    df["inc_trans_cs"] = df.groupby("location").cumcount().astype(float)
+    model_config = SimpleNamespace(p=2, d=0, P=0, D=0, season_period=1, theta_pooling="shared",
+                                   sigma_pooling="none", x=[], power_transform="4rt")
+    run_config = SimpleNamespace(disease="flu", ref_date=datetime.date(2023, 3, 11), max_horizon=2,
+                                 num_warmup=10, num_samples=10, num_chains=1, q_levels=[0.5], q_labels=["0.5"])
+    last_obs_date = pd.Timestamp("2023-03-04")
+
+    preds_df = SARIXModel(model_config).predict(run_config, df, last_obs_date=last_obs_date)
+
+    # the model is fit to the series up to and including the last observation
+    assert len(fits) == 1
+    cutoff_week = 22
+    np.testing.assert_array_equal(fits[0][:, :, 0], np.tile(np.arange(cutoff_week + 1.0), (2, 1)))
+
+    # forecasts start from the last observation, a week before the reference date
+    assert preds_df["horizon"].tolist() == [0, 0, 1, 1]
+    assert (preds_df["target_end_date"] - pd.to_timedelta(7 * preds_df["horizon"], unit="D") ==
+            pd.Timestamp(run_config.ref_date)).all()
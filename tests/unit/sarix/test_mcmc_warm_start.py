@@ -0,0 +1,126 @@
+import datetime
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from idmodels.sarix import SARIXModel
+
+numpyro = pytest.importorskip("numpyro")
+
+
+_FAKE_SARIX = """
+import json
+import os
+
+import jax
+import numpy as np
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, NUTS
+
+
+class SARIX():
+    def __init__(self, xy, forecast_horizon, num_warmup, num_samples, num_chains, **kwargs):
+        # record whether the sampler classes were replaced during the fit
+        with open(os.environ["FAKE_SARIX_LOG"], "a") as f:
+            f.write(json.dumps([xy.shape[0], NUTS is numpyro.infer.NUTS]) + "\\n")
+
+        def model(y):
+            mu = numpyro.sample("mu", dist.Normal(0, 10))
+            sigma = numpyro.sample("sigma", dist.HalfNormal(1))
+            numpyro.sample("y", dist.Normal(mu, sigma), obs=y)
+
+        mcmc = MCMC(NUTS(model), num_warmup=num_warmup, num_samples=num_samples, num_chains=num_chains,
+                    chain_method="sequential", progress_bar=False)
+        mcmc.run(jax.random.PRNGKey(0), y=xy[..., -1].ravel())
+        mu = np.asarray(mcmc.get_samples()["mu"])
+        self.predictions = np.broadcast_to(mu[:, None, None, None], (len(mu), xy.shape[0], forecast_horizon, 1))
+"""
+
+
+@pytest.fixture
+def fake_sarix(monkeypatch, tmp_path_factory):
+    """
+    Stand-in for the sarix package whose SARIX class fits a small model
+    with the NUTS and MCMC classes looked up from its module, as SARIX does.
+    It is importable in spawned worker processes, and each fit appends the
+    number of locations and whether the sampler classes were replaced to a
+    log; the fixture returns a function reading the log.
+    """
+    root = tmp_path_factory.mktemp("fake_sarix")
+    (root / "sarix").mkdir()
+    (root / "sarix" / "__init__.py").write_text("")
+    (root / "sarix" / "sarix.py").write_text(_FAKE_SARIX)
+    monkeypatch.syspath_prepend(str(root))
+    monkeypatch.delitem(sys.modules, "sarix", raising=False)
+    monkeypatch.delitem(sys.modules, "sarix.sarix", raising=False)
+    log_path = root / "calls.jsonl"
+    monkeypatch.setenv("FAKE_SARIX_LOG", str(log_path))
+
+    def calls():
+        if not log_path.exists():
+            return []
+        return [tuple(json.loads(line)) for line in log_path.read_text().splitlines()]
+
+    yield calls
+    sys.modules.pop("sarix", None)
+    sys.modules.pop("sarix.sarix", None)
+
+
+def test_warm_start_from_previous_ref_date(tmp_path, fake_sarix):
+    model_config = SimpleNamespace(model_name="sarix_test", p=1, d=0, P=0, D=0, season_period=1,
+                                   theta_pooling="shared", sigma_pooling="none", mcmc_warm_start=True,
+                                   warm_start_num_warmup=20)
+    batched_xy = np.random.default_rng(42).normal(loc=2.0, size=(3, 30, 1))
+
+    metadata = []
+    for ref_date in [datetime.date(2024, 1, 6), datetime.date(2024, 1, 13)]:
+        run_config = SimpleNamespace(ref_date=ref_date, artifact_store_root=tmp_path, max_horizon=2,
+                                     num_warmup=200, num_samples=100, num_chains=2)
+        predictions, mcmc_metadata = SARIXModel(model_config)._fit_predictions(run_config, batched_xy)
+        metadata.append(mcmc_metadata)
+
+    assert predictions.shape == (200, 3, 2, 1)
+    assert [m["warm_started"] for m in metadata] == [False, True]
+    assert [m["num_warmup"] for m in metadata] == [200, 20]
+    assert set(metadata[1]["diagnostics"]) == {"mu", "sigma"}
+    assert metadata[1]["diagnostics"]["mu"]["max_r_hat"] < 1.1
+    assert (tmp_path / "UMass-sarix_test" / "sampler_state" / "2024-01-13-UMass-sarix_test.npz").exists()
+    assert fake_sarix() == [(3, False)] * 2
+
+
+def test_no_warm_start_for_other_structure(tmp_path, fake_sarix):
+    model_config = SimpleNamespace(model_name="sarix_test", p=1, d=0, P=0, D=0, season_period=1,
+                                   theta_pooling="shared", sigma_pooling="none", mcmc_warm_start=True)
+    for ref_date, num_locations in [(datetime.date(2024, 1, 6), 3), (datetime.date(2024, 1, 13), 4)]:
+        run_config = SimpleNamespace(ref_date=ref_date, artifact_store_root=tmp_path, max_horizon=2,
+                                     num_warmup=50, num_samples=50, num_chains=1)
+        _, mcmc_metadata = SARIXModel(model_config)._fit_predictions(run_config, np.ones((num_locations, 10, 1)))
+
+    assert not mcmc_metadata["warm_started"]
+
+
+def test_tracked_fit_isolated_from_concurrent_fits(tmp_path, fake_sarix):
+    tracked_config = SimpleNamespace(model_name="sarix_tracked", p=1, d=0, P=0, D=0, season_period=1,
+                                     theta_pooling="shared", sigma_pooling="none", mcmc_diagnostics=True)
+    untracked_config = SimpleNamespace(model_name="sarix_untracked", p=1, d=0, P=0, D=0, season_period=1,
+                                       theta_pooling="shared", sigma_pooling="none")
+    run_config = SimpleNamespace(ref_date=datetime.date(2024, 1, 6), artifact_store_root=tmp_path, max_horizon=2,
+                                 num_warmup=100, num_samples=100, num_chains=1)
+
+    def fit(task):
+        model_config, num_locations = task
+        return SARIXModel(model_config)._fit_predictions(run_config, np.ones((num_locations, 10, 1)))
+
+    tasks = [(tracked_config, 3), (untracked_config, 4)] * 2
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(fit, tasks))
+
+    # untracked fits never see the replaced sampler classes
+    assert sorted(fake_sarix()) == [(3, False)] * 2 + [(4, True)] * 2
+    assert all(metadata is not None for _, metadata in results[::2])
+    assert all(metadata is None for _, metadata in results[1::2])
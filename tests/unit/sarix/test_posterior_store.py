@@ -0,0 +1,26 @@
+import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from idmodels.sarix import SARIXModel, load_posterior_samples
+
+
+def test_posterior_store_quantiles_match_in_memory(tmp_path):
+    rng = np.random.default_rng(42)
+    predictions = rng.normal(size=(200, 5, 3, 2))
+    model_config = SimpleNamespace(model_name="sarix_test", posterior_store=True, quantile_chunk_size=2)
+    run_config = SimpleNamespace(ref_date=datetime.date(2024, 1, 6), artifact_store_root=tmp_path)
+    locations = ["US", "01", "02", "04", "05"]
+    q = np.array([2.5, 50, 97.5])
+
+    model = SARIXModel(model_config)
+    samples = model._save_posterior(run_config, predictions, locations)
+    pred_qs = model._chunked_percentile(samples, q)
+
+    np.testing.assert_array_equal(pred_qs, np.percentile(predictions[..., 0], q, axis=0))
+
+    loaded, loaded_locations = load_posterior_samples(run_config, model_config)
+    assert isinstance(loaded, np.memmap)
+    assert loaded_locations == locations
+    np.testing.assert_array_equal(loaded, predictions[..., 0])
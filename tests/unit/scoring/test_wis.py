@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from idmodels.scoring import compare_wis, wis
+
+
+def _preds_df(values, location="US"):
+    return pd.DataFrame({
+        "location": location,
+        "reference_date": "2024-01-06",
+        "horizon": 0,
+        "target_end_date": "2024-01-06",
+        "target": "wk inc flu hosp",
+        "output_type": "quantile",
+        "output_type_id": ["0.25", "0.5", "0.75"],
+        "value": values
+    })
+
+
+def _target_df():
+    return pd.DataFrame({
+        "location": ["US", "01"],
+        "target_end_date": pd.to_datetime(["2024-01-06", "2024-01-06"]),
+        "observation": [10.0, 5.0]
+    })
+
+
+def test_wis():
+    actual = wis(_preds_df([8.0, 9.0, 12.0]), _target_df())
+    
+    # 50% interval score 4 with weight 0.5 / 2; absolute error of the median 1 with weight 1 / 2
+    assert actual.shape[0] == 1
+    assert actual["wis"].iloc[0] == pytest.approx((0.5 * 1.0 + 0.25 * 4.0) / 1.5)
+
+
+def test_compare_wis():
+    preds_by_model = {
+        "full": pd.concat([_preds_df([8.0, 9.0, 12.0]), _preds_df([4.0, 5.0, 6.0], location="01")]),
+        "anchor": _preds_df([9.0, 10.0, 11.0])
+    }
+    
+    actual = compare_wis(preds_by_model, _target_df())
+    
+    # only the forecast made by both models is compared
+    overall = actual.loc[actual["horizon"].isna()].set_index("model")
+    assert overall.loc["full", "wis"] == pytest.approx(wis(preds_by_model["full"], _target_df())["wis"].iloc[0])
+    assert overall.loc["full", "relative_wis"] == 1.0
+    assert overall.loc["anchor", "relative_wis"] == pytest.approx(
+        overall.loc["anchor", "wis"] / overall.loc["full", "wis"])
+    assert actual.loc[actual["horizon"] == 0].shape[0] == 2
@@ -0,0 +1,68 @@
+import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from idmodels.utils import save_predictions, save_table
+
+
+def _preds_df(ref_date):
+    return pd.DataFrame({
+        "location": ["US", "US", "25"],
+        "reference_date": str(ref_date),
+        "horizon": [0, 1, 0],
+        "output_type_id": ["0.5", "0.5", "0.5"],
+        "value": [1.0, 2.0, 3.0]
+    })
+
+
+def _configs(ref_date, model_name="gbqr", **run_settings):
+    return SimpleNamespace(ref_date=ref_date, **run_settings), SimpleNamespace(model_name=model_name)
+
+
+def test_save_predictions_csv_default(tmp_path):
+    ref_date = datetime.date(2024, 1, 6)
+    run_config, model_config = _configs(ref_date, output_root=tmp_path)
+    
+    save_predictions(_preds_df(ref_date), run_config, model_config)
+    
+    actual = pd.read_csv(tmp_path / "UMass-gbqr" / "2024-01-06-UMass-gbqr.csv", dtype={"location": str, "output_type_id": str})
+    pd.testing.assert_frame_equal(actual, _preds_df(ref_date))
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_save_table_columnar(tmp_path, output_format):
+    pa = pytest.importorskip("pyarrow")
+    ds = pytest.importorskip("pyarrow.dataset")
+    ref_date = datetime.date(2024, 1, 6)
+    run_config, model_config = _configs(ref_date)
+    
+    path = save_table(_preds_df(ref_date), tmp_path, run_config, model_config, output_format=output_format)
+    
+    assert path == tmp_path / "UMass-gbqr" / f"2024-01-06-UMass-gbqr.{output_format}"
+    table = ds.dataset(path, format="parquet" if output_format == "parquet" else "ipc").to_table()
+    assert pa.types.is_dictionary(table.schema.field("location").type)
+    actual = table.to_pandas().astype({"location": str, "reference_date": str, "output_type_id": str})
+    pd.testing.assert_frame_equal(actual, _preds_df(ref_date))
+
+
+def test_save_table_partitioned(tmp_path):
+    pytest.importorskip("pyarrow")
+    for ref_date in [datetime.date(2024, 1, 6), datetime.date(2024, 1, 13)]:
+        for model_name in ["gbqr", "sarix"]:
+            run_config, model_config = _configs(ref_date, model_name, output_root=tmp_path,
+                                                output_format="parquet", partition_output=True)
+            save_predictions(_preds_df(ref_date), run_config, model_config)
+    
+    assert (tmp_path / "model_id=UMass-sarix" / "reference_date=2024-01-13" / "part-0.parquet").exists()
+    actual = pd.read_parquet(tmp_path)
+    assert actual.shape[0] == 12
+    assert sorted(actual["model_id"].unique()) == ["UMass-gbqr", "UMass-sarix"]
+    assert sorted(actual["reference_date"].astype(str).unique()) == ["2024-01-06", "2024-01-13"]
+
+
+def test_save_table_invalid_format(tmp_path):
+    run_config, model_config = _configs(datetime.date(2024, 1, 6))
+    with pytest.raises(ValueError):
+        save_table(_preds_df(run_config.ref_date), tmp_path, run_config, model_config, output_format="xlsx")